@@ -1,28 +1,25 @@
 # -*- coding: utf-8 -*-
 """Main entry point for the music generator"""
 
+import functools
 import logging
 import os
 import random
 import sys
+import threading
 from typing import Callable, List, Type
 
 from bach_generator import cli, runner
-from bach_generator.src import manager, model, music_handler
+from bach_generator.src import cache, manager, model, music_handler, parallel
 
 
 def construct_model_managers(args) -> List[manager.ModelManager]:
     """Constructs model managers or loads them from file"""
     if args.load_filepath:
-        model_managers = [
+        return [
             manager.ModelManager.construct_with_model(model_)
-            for model_ in model.load_models(args.load_filepath)
+            for model_ in model.load_models(args.load_filepath, amount=args.load_best)
         ]
-        return (
-            model_managers
-            if args.load_best is None
-            else model_managers[: args.load_best]
-        )
 
     return [
         manager.ModelManager(
@@ -50,7 +47,8 @@ def get_music_handler(args) -> music_handler.BaseMusicHandler:
         "simple": music_handler.SimpleMusicHandler,
         "copy": music_handler.CopyMusicHandler,
     }
-    return handlers.get(args.rhythm_handler)()
+    parse_cache = None if args.no_parse_cache else cache.ParseCache()
+    return handlers.get(args.rhythm_handler)(cache=parse_cache, fast_parse=args.fast_parse)
 
 
 def get_layer_type(args) -> Type:
@@ -64,8 +62,12 @@ def get_layer_type(args) -> Type:
 
 def get_run_function(args) -> Callable:
     """Returns the run function chosen from cli args"""
+    if args.chunk_size is not None:
+        return functools.partial(runner.run_models_in_chunks, chunk_size=args.chunk_size)
+    if args.batched:
+        return runner.run_models_batched
     if args.parallel:
-        return runner.run_models_in_parallel
+        return parallel.WorkerPool()
     return runner.run_models
 
 
@@ -81,10 +83,14 @@ def setup_simulation(args):
         clones_per_model_per_generation=args.clones,
         write_best_model_generation_interval=args.write_interval,
         weight_jumble_strategy=get_weight_jumble_strategy(args),
+        seeded_clones=args.seeded_clones,
     )
 
     runner_ = runner.GeneticAlgorithmRunner(
-        music_handler=get_music_handler(args), run_function=get_run_function(args)
+        music_handler=get_music_handler(args),
+        run_function=get_run_function(args),
+        direct_midi_output=args.direct_midi,
+        chunk_size=args.chunk_size,
     )
     runner_.setup(input_file=args.filepath, output_directory=args.output_dir)
     return runner_, runner_data, model_managers
@@ -93,15 +99,28 @@ def setup_simulation(args):
 def run_simulation(args):
     """Runs the simulation with the specified command line arguments"""
     runner_, runner_data, model_managers = setup_simulation(args)
+    completed = False
     try:
         model_managers = runner_.run(model_managers, data=runner_data)
+        completed = True
     except KeyboardInterrupt:
         logging.info("Interrupted model run")
+    finally:
+        runner_.close(terminate=not completed)
 
     if args.save:
-        filepath = os.path.join(runner_.output_handler.directory, "models.json")
         models = [model_manager.model for model_manager in model_managers]
-        model.save_models(models, filepath)
+        if args.save_format == "binary":
+            filepath = os.path.join(runner_.output_handler.directory, "models.bin")
+            # clones carry the rating of their parent until they are run
+            ratings = [
+                model_manager.rating if model_manager.rated else None
+                for model_manager in model_managers
+            ]
+            model.save_models_binary(models, filepath, ratings=ratings)
+        else:
+            filepath = os.path.join(runner_.output_handler.directory, "models.json")
+            model.save_models(models, filepath)
         logging.info("Saved models to file")
 
 
@@ -117,6 +136,12 @@ def run_gui(app, init):
         if app.destroyed:
             return
         raise exc
+    finally:
+        # the worker thread is a daemon, so it has to be joined to release its runner
+        worker = app.data.get("worker")
+        if worker is not None:
+            worker.cancel()
+            worker.join()
 
 
 class StreamHandler(logging.StreamHandler):
@@ -127,7 +152,9 @@ class StreamHandler(logging.StreamHandler):
         self.app = gui_app
 
     def emit(self, record: logging.LogRecord) -> None:
-        if self.app and not self.app.destroyed:
+        # tk variables may only be set from the main thread, not e.g. a simulation worker
+        in_main_thread = threading.current_thread() is threading.main_thread()
+        if self.app and not self.app.destroyed and in_main_thread:
             self.app.data["message"].set("Status: " + record.getMessage())
         super().emit(record)
 
@@ -28,6 +28,22 @@ def construct_parser() -> argparse.ArgumentParser:
         help="Enables parallel computation using multiple CPU cores",
     )
 
+    parser.add_argument(
+        "--batched",
+        "-b",
+        action="store_true",
+        default=False,
+        help="Evaluates all models of each generation at once (takes precedence over -p)",
+    )
+
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=None,
+        help="Evaluates models chunk by chunk of the input notes with bounded memory "
+        "(takes precedence over -b and -p)",
+    )
+
     parser.add_argument(
         "--save",
         action="store_true",
@@ -35,10 +51,18 @@ def construct_parser() -> argparse.ArgumentParser:
         help="Saves the surviving models to json file at the end of the simulation",
     )
 
+    parser.add_argument(
+        "--save-format",
+        choices=["json", "binary"],
+        default="json",
+        help="The file format of the saved models. Binary model files are smaller and "
+        "load faster",
+    )
+
     parser.add_argument(
         "--load",
         dest="load_filepath",
-        help="The json filepath from which to load serialized models",
+        help="The json or binary model filepath from which to load serialized models",
     )
 
     parser.add_argument(
@@ -113,6 +137,13 @@ def construct_parser() -> argparse.ArgumentParser:
         help="The method to be used to jumble model weights on cloning",
     )
 
+    parser.add_argument(
+        "--seeded-clones",
+        action="store_true",
+        default=False,
+        help="Describes clones by a random seed and only constructs the selected ones",
+    )
+
     parser.add_argument(
         "--weight-divergence",
         "-wd",
@@ -129,6 +160,13 @@ def construct_parser() -> argparse.ArgumentParser:
         help="The generation interval between writing top model results to file",
     )
 
+    parser.add_argument(
+        "--direct-midi",
+        action="store_true",
+        default=False,
+        help="Writes the notes of the results straight to midi files instead of using music21",
+    )
+
     parser.add_argument(
         "--output-dir",
         "-o",
@@ -145,6 +183,22 @@ def construct_parser() -> argparse.ArgumentParser:
         help="The rhythm generation strategy to use",
     )
 
+    parser.add_argument(
+        "--fast-parse",
+        action="store_true",
+        default=False,
+        help="Reads the notes of midi files directly, falling back to music21 if needed",
+    )
+
+    parser.add_argument(
+        "--no-parse-cache",
+        action="store_true",
+        default=False,
+        help="Always parses the input file instead of reading the notes from the cache. "
+        "By default, the parsed notes of the 32 most recently used input files are kept "
+        "in $XDG_CACHE_HOME/bach_generator (~/.cache/bach_generator)",
+    )
+
     parser.add_argument(
         "--seed",
         type=int,
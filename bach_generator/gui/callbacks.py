@@ -5,8 +5,11 @@ import logging
 from tkinter.filedialog import askopenfilename
 
 from bach_generator.gui import app, args, config, figure, root
+from bach_generator.gui.worker import SimulationWorker
 
 MAX_LENGTH = 120
+# interval in which the tk main loop polls the progress of a running simulation
+POLL_INTERVAL_MS = 100
 
 
 def set_gui_config_defaults(*_):
@@ -85,7 +88,15 @@ def _set_filepath_error():
 
 
 def run_simulation(*_):
-    """Callback for run button"""
+    """Callback for run button: starts the simulation on a background worker, or cancels
+    the running simulation
+    """
+    worker = app.data.get("worker")
+    if worker is not None and worker.is_alive():
+        worker.cancel()
+        logging.info("Status: cancelling after the current generation.")
+        return
+
     command = app["config"]["command_text"].tk_component.get(
         "1.0", "end-1c"
     )  # get all text in the widget except the trailing newline
@@ -104,26 +115,71 @@ def run_simulation(*_):
         _set_filepath_error()
         return
 
-    function = app.data["setup_function"]
-    runner_, runner_data, model_managers = function(args_)
-    generations = runner_data.generations
+    app["plot"].activate()
+    app.pack_all()
+
+    worker = SimulationWorker(app.data["setup_function"], args_)
+    app.data["worker"] = worker
+    worker.start()
+    _set_running(True)
+    line = app["plot"]["rating_fig"].tk_component.add_line(app.data["colour_picker"].colour)
+    root.after(POLL_INTERVAL_MS, _poll_progress, worker, [], line)
+
+
+def pause_simulation(*_):
+    """Callback for pause button: pauses or resumes the running simulation"""
+    worker = app.data.get("worker")
+    if worker is None or not worker.is_alive():
+        return
+    if worker.paused:
+        worker.resume()
+        logging.info("Status: resumed.")
+    else:
+        worker.pause()
+        logging.info("Status: pausing after the current generation.")
+    app["config"]["pause_button"].config(text="Resume" if worker.paused else "Pause")
+
+
+def _poll_progress(worker: SimulationWorker, ratings, line: int):
+    """Plots the generations posted by the worker since the last poll, then polls again
+    until the worker is done
+    """
+    if app.destroyed:
+        return
 
-    ratings = []
-    colour = app.data["colour_picker"].colour
-    for i in range(generations):
-        runner_data.generations = i + 1
-        model_managers = runner_.run(
-            model_managers, data=runner_data, start_generation=i + 1
+    progress = None
+    while not worker.progress.empty():
+        progress = worker.progress.get_nowait()
+        ratings.append(progress.rating)
+    if progress is not None:
+        app.data["message"].set(
+            f"Status: generation {progress.generation} (steptime={round(progress.steptime, 2)})"
+            f". Amount of models: {progress.models}."
+            f" Best manager rating: {round(progress.rating * 100, 2)}%"
         )
-        ratings.append(model_managers[0].rating if model_managers else 0)
-        _plot_data(ratings, colour)
-        root.update()  # avoid window freeze
+        _plot_data(ratings, line)
 
-    logging.info("Finished running command.")
+    if worker.is_alive():
+        root.after(POLL_INTERVAL_MS, _poll_progress, worker, ratings, line)
+        return
 
+    _set_running(False)
+    if worker.error is not None:
+        app.data["message"].set(f"Simulation failed: {worker.error}")
+    elif worker.cancelled:
+        logging.info("Cancelled running command.")
+    else:
+        logging.info("Finished running command.")
 
-def _plot_data(ratings, colour: str):
-    app["plot"]["rating_fig"].tk_component.plot(
-        figure.DataSet(y=ratings, line_colour=colour)
-    )
-    app["plot"].pack()
+
+def _set_running(running: bool):
+    app["config"]["run_button"].config(text="Cancel simulation" if running else "Run simulation")
+    app["config"]["pause_button"].config(text="Pause")
+    if running:
+        app["config"].unhide_component("pause_button")
+    else:
+        app["config"].hide_component("pause_button")
+
+
+def _plot_data(ratings, line: int):
+    app["plot"]["rating_fig"].tk_component.set_line_data(line, figure.DataSet(y=ratings))
@@ -5,16 +5,19 @@ Created on Sat Jan 30 14:41:51 2021
 @author: Korean_Crimson
 """
 # pylint: disable=invalid-name
+import time
 import warnings
 from dataclasses import dataclass, field
-from typing import Iterable, Optional
+from typing import Any, Dict, Iterable, List, Optional
 
-import matplotlib
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+import numpy
 
 warnings.filterwarnings("ignore")
-matplotlib.use("TkAgg")
+
+# most points plotted per line, longer datasets are decimated
+MAX_PLOT_POINTS = 2000
+# least time between redraws of the canvas
+DRAW_INTERVAL_MS = 200
 
 
 @dataclass
@@ -55,20 +58,65 @@ class DataSet:
 
 
 class Figure:
-    """Wrapper class around matplotlib plots for tkinter (FigureCanvasTkAgg)"""
+    """Wrapper class around matplotlib plots for tkinter (FigureCanvasTkAgg).
+    matplotlib is imported and the figure and its canvas are created on first use,
+    e.g. when the figure is first plotted or added to the grid.
+    """
 
     def __init__(self, parent, bg_colour, axes_colour):
         self.parent = parent
         self.bg_colour = bg_colour
         self.axes_colour = axes_colour
-        self.figure = plt.figure()
-        self.axes = self.figure.add_subplot(111)
-        self.canvas = FigureCanvasTkAgg(self.figure, master=self.parent)
-        self.tk_widget = self.canvas.get_tk_widget()
-        rect = self.figure.patch
-        rect.set_facecolor(self.bg_colour)
+        self._figure = None
+        self._axes = None
+        self._canvas = None
+        self._labels: Optional[Dict[str, Any]] = None
+        self._lines: List[Any] = []
+        self._last_draw_time = 0.0
+        self._draw_pending = False
         self._y_lim = 0
 
+    @property
+    def figure(self):
+        """The matplotlib figure"""
+        self._create()
+        return self._figure
+
+    @property
+    def axes(self):
+        """The matplotlib axes of the figure"""
+        self._create()
+        return self._axes
+
+    @property
+    def canvas(self):
+        """The tkinter canvas of the figure"""
+        self._create()
+        return self._canvas
+
+    @property
+    def tk_widget(self):
+        """The tk widget of the canvas"""
+        return self.canvas.get_tk_widget()
+
+    def _create(self):
+        if self._figure is not None:
+            return
+        # pylint: disable=import-outside-toplevel
+        import matplotlib
+
+        matplotlib.use("TkAgg")
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+        self._figure = plt.figure()
+        self._axes = self._figure.add_subplot(111)
+        self._canvas = FigureCanvasTkAgg(self._figure, master=self.parent)
+        rect = self._figure.patch
+        rect.set_facecolor(self.bg_colour)
+        if self._labels is not None:
+            self.set_labels(**self._labels)
+
     # pylint: disable=disallowed-name #bar
     def plot(self, *datasets: DataSet, normalized=False, annotate=False, bar=False):
         """Plots the passed datasets.
@@ -106,6 +154,48 @@ class Figure:
                 self.axes.set_xticks(xticks)
                 self.axes.set_xticklabels(annotations)
 
+    def add_line(self, colour: str) -> int:
+        """Adds an empty line to the axes, e.g. for a run whose data grows over time.
+        Returns the index of the line, to be updated with set_line_data.
+        """
+        (line,) = self.axes.plot([], [], color=colour)
+        self._lines.append(line)
+        return len(self._lines) - 1
+
+    def set_line_data(self, index: int, dataset: DataSet, max_points: int = MAX_PLOT_POINTS):
+        """Replaces the data of the line with the passed dataset, decimated to max_points
+        points, and redraws the canvas. Unlike plot, no new line is added to the axes.
+        """
+        y = numpy.asarray(dataset.y, dtype=float)
+        x = numpy.arange(len(y)) if dataset.x is None else numpy.asarray(dataset.x, dtype=float)
+        if len(y) > max_points:
+            indices = numpy.linspace(0, len(y) - 1, max_points).round().astype(int)
+            x, y = x[indices], y[indices]
+        self._lines[index].set_data(x, y)
+
+        self.axes.set_xlim(*dataset.x_limits)
+        self._y_lim = max(self._y_lim, dataset.y_limits[1])
+        self.axes.set_ylim(0, self._y_lim)
+        self.draw()
+
+    def draw(self):
+        """Redraws the canvas when idle, at most once every DRAW_INTERVAL_MS.
+        Redraws requested in between are combined into one.
+        """
+        if self._draw_pending:
+            return
+        elapsed_ms = (time.monotonic() - self._last_draw_time) * 1000
+        if elapsed_ms >= DRAW_INTERVAL_MS:
+            self._draw()
+        else:
+            self._draw_pending = True
+            self.tk_widget.after(int(DRAW_INTERVAL_MS - elapsed_ms) + 1, self._draw)
+
+    def _draw(self):
+        self._draw_pending = False
+        self._last_draw_time = time.monotonic()
+        self.canvas.draw_idle()
+
     def grid(self, *args, **kwargs):
         """Adds the tk widget to the grid"""
         self._colour_axes()
@@ -114,7 +204,8 @@ class Figure:
 
     def grid_forget(self, *args, **kwargs):
         """Removes the tk widget from the grid"""
-        self.tk_widget.grid_forget(*args, **kwargs)
+        if self._canvas is not None:
+            self.tk_widget.grid_forget(*args, **kwargs)
 
     def config(self, *args, **kwargs):
         """Calls config on the tk widget"""
@@ -132,8 +223,19 @@ class Figure:
     def set_labels(
         self, title="", x_title="", y_title="", title_fontsize=12, axes_fontsize=10
     ):
-        """Sets title and axes titles"""
+        """Sets title and axes titles. Before the figure is created, they are set once
+        it is created.
+        """
         # pylint: disable=R0913
+        if self._figure is None:
+            self._labels = {
+                "title": title,
+                "x_title": x_title,
+                "y_title": y_title,
+                "title_fontsize": title_fontsize,
+                "axes_fontsize": axes_fontsize,
+            }
+            return
         self.axes.set_title(title, fontsize=title_fontsize, color=self.axes_colour)
         self.axes.set_ylabel(y_title, fontsize=axes_fontsize, color=self.axes_colour)
         self.axes.set_xlabel(x_title, fontsize=axes_fontsize, color=self.axes_colour)
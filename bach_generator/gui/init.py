@@ -13,7 +13,12 @@ from bach_generator.gui import app, args, callbacks, components, config, figure,
 
 
 def on_quit():
-    """Destroys the window"""
+    """Cancels a running simulation, then destroys the window. The simulation is finished
+    once the main loop returns, see run_gui
+    """
+    worker = app.data.get("worker")
+    if worker is not None:
+        worker.cancel()
     root.destroy()
 
 
@@ -185,9 +190,27 @@ def init_config_view():
             row=len(actions) + 3,
             column=2,
             row_span=1,
-        )
+        ),
+        name="run_button",
     )
 
+    view.add_component(
+        components.Component(
+            tk.Button(
+                frame,
+                text="Pause",
+                command=callbacks.pause_simulation,
+                **config.BUTTON_THEME,
+            ),
+            sticky="NSEW",
+            row=len(actions) + 1,
+            column=2,
+            row_span=1,
+        ),
+        name="pause_button",
+    )
+    view.hide_component("pause_button")
+
     view.add_component(
         components.Component(
             tk.Text(
@@ -229,9 +252,10 @@ def init_config_view():
 
 
 def init_plot_view():
-    """Initializes results and plots view"""
+    """Initializes results and plots view. The view is only activated on the first run,
+    so that the rating figure is not created before it is needed.
+    """
     view = components.View(app)
-    view.activate()
 
     frame = tk.Frame(root, bd=0, bg=config.BG)
     component = components.Frame(
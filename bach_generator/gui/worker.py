@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Runs the simulation of the gui on a background thread"""
+
+import logging
+import queue
+import threading
+from typing import Any, Callable, Optional
+
+from bach_generator.runner import GeneticAlgorithmRunner
+
+
+class SimulationWorker(threading.Thread):
+    """Sets up and runs a simulation on a background thread, so that the Tk main loop
+    keeps running. The whole simulation is a single run of the runner, whose
+    GenerationResults are posted to the progress queue, to be polled by the Tk main loop.
+    The simulation can be paused and cancelled between generations.
+    """
+
+    def __init__(self, setup_function: Callable, args: Any):
+        super().__init__(name="simulation", daemon=True)
+        self.setup_function = setup_function
+        self.args = args
+        self.progress: queue.Queue = queue.Queue()
+        self.error: Optional[Exception] = None
+        self._runner: Optional[GeneticAlgorithmRunner] = None
+        self._cancelled = threading.Event()
+        self._resumed = threading.Event()
+        self._resumed.set()
+
+    def run(self) -> None:
+        try:
+            self._runner, runner_data, model_managers = self.setup_function(self.args)
+        except Exception as exc:  # pylint: disable=broad-except
+            logging.exception("Failed to set up the simulation")
+            self.error = exc
+            return
+
+        try:
+            if self._cancelled.is_set():  # cancelled during the setup
+                self._runner.stop()
+            for result in self._runner.iterate(model_managers, data=runner_data):
+                self.progress.put(result)
+                self._resumed.wait()  # the next generation is only run once resumed
+        except Exception as exc:  # pylint: disable=broad-except
+            logging.exception("Failed to run the simulation")
+            self.error = exc
+        finally:
+            self._runner.close(terminate=self.error is not None)
+
+    @property
+    def paused(self) -> bool:
+        """Whether the simulation is paused"""
+        return not self._resumed.is_set()
+
+    def pause(self) -> None:
+        """Pauses the simulation after the current generation"""
+        self._resumed.clear()
+
+    def resume(self) -> None:
+        """Resumes a paused simulation"""
+        self._resumed.set()
+
+    def cancel(self) -> None:
+        """Stops the simulation after the current generation"""
+        self._cancelled.set()
+        if self._runner is not None:
+            self._runner.stop()
+        self._resumed.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the simulation was cancelled"""
+        return self._cancelled.is_set()
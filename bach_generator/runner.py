@@ -4,18 +4,26 @@
 from __future__ import annotations
 
 import logging
+import random
+import threading
 import time
 from dataclasses import dataclass, field
-from functools import partial
-from multiprocessing import Pool
-from typing import Callable, List
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
+import numpy
+
+from bach_generator.src import population, streaming
 from bach_generator.src.encoder import Encoder, Quantizer
 from bach_generator.src.judge import Judge
 from bach_generator.src.manager import ModelManager
-from bach_generator.src.model import JumbleStrategy, jumble_by_factor_strategy
+from bach_generator.src.model import (
+    JumbleStrategy,
+    construct_input_windows,
+    jumble_by_factor_strategy,
+)
 from bach_generator.src.music_handler import CopyMusicHandler
-from bach_generator.src.output_handler import OutputHandler
+from bach_generator.src.output_handler import BackgroundWriter, OutputHandler
+from bach_generator.src.parallel import WorkerPool
 
 
 @dataclass
@@ -28,6 +36,38 @@ class RunnerData:
     clones_per_model_per_generation: int = 5
     write_best_model_generation_interval: int = 10
     weight_jumble_strategy: JumbleStrategy = jumble_by_factor_strategy
+    seeded_clones: bool = False
+
+
+@dataclass
+class GenerationResult:
+    """Progress of a run after a generation, see GeneticAlgorithmRunner.iterate"""
+
+    generation: int
+    rating: float
+    steptime: float
+    models: int
+    # ratings of the whole population of the generation before the selection, including
+    # the models selected in earlier generations, which are not rated again
+    ratings: numpy.ndarray = field(repr=False)
+    # the models selected in the generation and their clones, best first
+    model_managers: List[ModelManager] = field(repr=False)
+
+
+def _generation_result(
+    generation: int,
+    steptime: float,
+    rated_managers: List[ModelManager],
+    model_managers: List[ModelManager],
+) -> GenerationResult:
+    return GenerationResult(
+        generation=generation,
+        rating=model_managers[0].rating,
+        steptime=steptime,
+        models=len(model_managers),
+        ratings=numpy.array([manager.rating for manager in rated_managers]),
+        model_managers=model_managers,
+    )
 
 
 def _select_best_models(
@@ -38,42 +78,101 @@ def _select_best_models(
 
 def _append_clones(model_managers: List[ModelManager], data: RunnerData) -> None:
     clones = [
-        manager.clone(data.weight_jumble_strategy, data.weight_divergence)
+        _clone(manager, data)
         for _ in range(data.clones_per_model_per_generation)
         for manager in model_managers
     ]
     model_managers.extend(clones)
 
 
+def _clone(model_manager: ModelManager, data: RunnerData) -> ModelManager:
+    if data.seeded_clones:
+        seed = random.getrandbits(32)
+        return model_manager.clone_with_seed(
+            data.weight_jumble_strategy, data.weight_divergence, seed
+        )
+    return model_manager.clone(data.weight_jumble_strategy, data.weight_divergence)
+
+
 def run_models(
     runner: GeneticAlgorithmRunner, model_managers: List[ModelManager]
 ) -> List[ModelManager]:
     """Runs models in sequence using the specified runner"""
     for model_manager in model_managers:
-        run_model(runner.encoded_inputs, runner.quantizer, runner.judge, model_manager)
+        run_model(
+            runner.encoded_inputs,
+            runner.quantizer,
+            runner.judge,
+            model_manager,
+            runner.get_input_windows(model_manager.model.inputs),
+        )
     return model_managers
 
 
-def run_models_in_parallel(
+def run_models_batched(
     runner: GeneticAlgorithmRunner, model_managers: List[ModelManager]
 ) -> List[ModelManager]:
-    """Runs models in parallel using the specified runner"""
-    function_ = partial(
-        run_model, runner.encoded_inputs, runner.quantizer, runner.judge
-    )
-    with Pool() as pool:
-        model_managers = pool.map(function_, model_managers, chunksize=20)
+    """Runs all same-shaped models at once using the specified runner.
+    Models without effective weights are run in sequence.
+    """
+    for shape, managers in population.group_by_shape(model_managers).items():
+        if shape is None:
+            run_models(runner, managers)
+            continue
+
+        windows = runner.get_input_windows(managers[0].model.inputs)
+        models = [model_manager.model for model_manager in managers]
+        outputs = population.compute_population(models, windows)
+        quantized_outputs = runner.quantizer.quantize_matrix(outputs)
+        ratings = runner.judge.rate_all(quantized_outputs)
+        for model_manager, rating, encoded_outputs in zip(
+            managers, ratings.tolist(), quantized_outputs
+        ):
+            model_manager.set_result(rating, encoded_outputs.tolist())
+    return model_managers
+
+
+def run_models_in_chunks(
+    runner: GeneticAlgorithmRunner,
+    model_managers: List[ModelManager],
+    chunk_size: int = streaming.DEFAULT_CHUNK_SIZE,
+) -> List[ModelManager]:
+    """Runs models in sequence using the specified runner, processing the inputs in chunks
+    of the specified size. Only the ratings are kept, so memory use does not grow with
+    the length of the inputs.
+    """
+    for model_manager in model_managers:
+        rating = streaming.rate_in_chunks(
+            model_manager.model,
+            runner.encoded_inputs,
+            runner.quantizer,
+            runner.judge,
+            chunk_size,
+        )
+        model_manager.set_result(rating)
     return model_managers
 
 
+def run_models_in_parallel(
+    runner: GeneticAlgorithmRunner, model_managers: List[ModelManager]
+) -> List[ModelManager]:
+    """Runs models in parallel using the specified runner, on a pool of worker processes
+    that only lives for this call. To reuse the workers across generations, use a
+    WorkerPool as run function instead.
+    """
+    with WorkerPool() as pool:
+        return pool(runner, model_managers)
+
+
 def run_model(
     encoded_inputs: List[int],
     quantizer: Quantizer,
     judge: Judge,
     model_manager: ModelManager,
+    input_windows: Optional[numpy.ndarray] = None,
 ) -> ModelManager:
     """Runs and rates the specified model"""
-    model_manager.run_model(encoded_inputs, quantizer)
+    model_manager.run_model(encoded_inputs, quantizer, input_windows)
     model_manager.get_rated_by(judge, encoded_inputs)
     return model_manager
 
@@ -92,9 +191,15 @@ class GeneticAlgorithmRunner:
     run_function: Callable[
         [GeneticAlgorithmRunner, List[ModelManager]], List[ModelManager]
     ] = run_models
+    direct_midi_output: bool = False
+    # computes the written outputs chunk by chunk of the inputs, see run_models_in_chunks
+    chunk_size: Optional[int] = None
+    output_writer: BackgroundWriter = field(default_factory=BackgroundWriter)
 
     def __post_init__(self):
         self.encoded_inputs: List[int] = []
+        self.input_windows: Dict[int, numpy.ndarray] = {}
+        self._stop_requested = threading.Event()
 
     def setup(self, input_file: str, output_directory: str) -> None:
         """Sets up the output directory and parses the input file"""
@@ -109,42 +214,150 @@ class GeneticAlgorithmRunner:
         note_names = self.music_handler.parse(input_file)
         self.encoded_inputs = self.encoder.encode(note_names)
         self.quantizer.setup(self.encoded_inputs)
+        self.judge.setup(self.encoded_inputs)
+        self.input_windows = {}
+
+    def get_input_windows(self, size: int) -> numpy.ndarray:
+        """Returns the matrix of sliding input windows of the specified size.
+        The matrix is constructed once per input file and window size.
+        """
+        if size not in self.input_windows:
+            self.input_windows[size] = construct_input_windows(self.encoded_inputs, size)
+        return self.input_windows[size]
 
     def run(
         self,
         model_managers: List[ModelManager],
         data: RunnerData,
         start_generation: int = 1,
+        progress_callback: Optional[Callable[[GenerationResult], None]] = None,
     ) -> List[ModelManager]:
         """Runs a genetic algorithm with the models using the input RunnerData.
         Returns a sorted list of evolved models once finished.
+        The progress callback is called with a GenerationResult after every generation.
+        See iterate for details.
         """
-        if not model_managers:
-            return []
-
-        for i in range(start_generation, data.generations + 1):
-            start_time = time.time()
-
-            model_managers = self.run_function(self, model_managers)
-            model_managers = _select_best_models(
-                model_managers, amount=data.selected_models_per_generation
-            )
-            _append_clones(model_managers, data)
-
-            best_manager = model_managers[0]
-            logging.info(
-                "Generation %i (steptime=%s). Amount of models: %s. Best manager rating: %s%%",
-                i,
-                round(time.time() - start_time, 2),
-                len(model_managers),
-                round(best_manager.rating * 100, 2),
-            )
-            if i % data.write_best_model_generation_interval == 0:
-                self._write_model_output(model_manager=best_manager, generation=i)
+        generations = self._run_generations(model_managers, data, start_generation)
+        try:
+            for generation in generations:
+                model_managers = generation[-1]
+                if progress_callback is not None:
+                    progress_callback(_generation_result(*generation))
+        finally:
+            generations.close()  # ends the run, e.g. if the callback is interrupted
         return model_managers
 
+    def iterate(
+        self,
+        model_managers: List[ModelManager],
+        data: RunnerData,
+        start_generation: int = 1,
+    ) -> Iterator[GenerationResult]:
+        """Runs a genetic algorithm with the models using the input RunnerData like run,
+        yielding a GenerationResult after every generation. The next generation is only run
+        once the next result is requested, so the caller can stop the run early.
+        Models that have not changed since they were last rated (i.e. the models selected
+        in the previous generation) are not run again. Outputs are written in the background
+        and flushed when the run ends, also if it is interrupted or closed early.
+        The run also ends early if stop is called, e.g. from another thread.
+        """
+        generations = self._run_generations(model_managers, data, start_generation)
+        try:
+            for generation in generations:
+                yield _generation_result(*generation)
+        finally:
+            generations.close()
+
+    def _run_generations(
+        self,
+        model_managers: List[ModelManager],
+        data: RunnerData,
+        start_generation: int,
+    ) -> Iterator[Tuple[int, float, List[ModelManager], List[ModelManager]]]:
+        # yields the generation, its steptime, the rated and the selected models after
+        # every generation, see iterate. Results are only built if they are consumed.
+        if not model_managers:
+            return
+
+        completed = False
+        try:
+            for i in range(start_generation, data.generations + 1):
+                if self._stop_requested.is_set():
+                    logging.info("Stopped run before generation %i", i)
+                    break
+                start_time = time.time()
+
+                rated_managers = [manager for manager in model_managers if manager.rated]
+                unrated_managers = [manager for manager in model_managers if not manager.rated]
+                rated_managers += self.run_function(self, unrated_managers)
+                model_managers = _select_best_models(
+                    rated_managers, amount=data.selected_models_per_generation
+                )
+                _append_clones(model_managers, data)
+
+                best_manager = model_managers[0]
+                steptime = time.time() - start_time
+                logging.info(
+                    "Generation %i (steptime=%s). Amount of models: %s. "
+                    "Best manager rating: %s%%",
+                    i,
+                    round(steptime, 2),
+                    len(model_managers),
+                    round(best_manager.rating * 100, 2),
+                )
+                if i % data.write_best_model_generation_interval == 0:
+                    self._write_model_output(model_manager=best_manager, generation=i)
+                yield i, steptime, rated_managers, model_managers
+            completed = True
+        finally:
+            self._stop_requested.clear()
+            if completed:
+                self.output_writer.flush()
+            else:  # errors of the writer must not hide the error ending the run
+                try:
+                    self.output_writer.flush()
+                except Exception:  # pylint: disable=broad-except
+                    logging.exception("Failed to write outputs")
+
+    def stop(self) -> None:
+        """Stops the current run after the current generation. If called before a run
+        starts, the run stops right away. Can be called from any thread.
+        """
+        self._stop_requested.set()
+
+    def close(self, terminate: bool = False) -> None:
+        """Releases resources held for the whole run, e.g. worker pools of the run function
+        and the background output writer. Set terminate after a failed or interrupted run,
+        to stop worker processes without waiting for them
+        """
+        try:
+            self.output_writer.close()
+        finally:
+            close = getattr(self.run_function, "close", None)
+            if close is not None:
+                close(terminate=terminate)
+
     def _write_model_output(self, model_manager: ModelManager, generation: int) -> None:
+        if not model_manager.encoded_outputs:  # e.g. not returned by worker processes
+            if self.chunk_size is not None:  # without the matrix of all input windows
+                outputs = streaming.compute_in_chunks(
+                    model_manager.model, self.encoded_inputs, self.chunk_size
+                )
+                model_manager.quantize_outputs(outputs, self.quantizer)
+            else:
+                windows = self.get_input_windows(model_manager.model.inputs)
+                model_manager.run_model(self.encoded_inputs, self.quantizer, windows)
+
         rounded_rating = int(round(model_manager.rating, 2) * 100)
         model_manager.decode_outputs(self.encoder)
-        score = self.music_handler.generate_score(model_manager.decoded_outputs)
-        self.output_handler.write(score, f"output_{generation}_{rounded_rating}.mid")
+        filename = f"output_{generation}_{rounded_rating}.mid"
+        self.output_writer.submit(self._write_notes, list(model_manager.decoded_outputs), filename)
+
+    def _write_notes(self, note_names: List[str], filename: str) -> None:
+        # runs on the thread of the output writer
+        if self.direct_midi_output:
+            notes = self.music_handler.generate_notes(note_names)
+            self.output_handler.write_notes(notes, filename)
+        else:
+            score = self.music_handler.generate_score(note_names)
+            self.output_handler.write(score, filename)
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""On-disk cache of the note names parsed from input files, so that repeated runs on
+the same file do not have to parse it with music21 again.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+# bump to invalidate existing cache entries when the parsed format changes
+CACHE_VERSION = 1
+DEFAULT_MAX_ENTRIES = 32
+
+
+def get_default_directory() -> str:
+    """Returns the default cache directory, inside the user cache directory"""
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "bach_generator")
+
+
+@dataclass
+class ParseCache:
+    """Stores parsed note names keyed by input file content and music handler type.
+    Only the max_entries most recently used entries are kept.
+    """
+
+    directory: str = field(default_factory=get_default_directory)
+    max_entries: int = DEFAULT_MAX_ENTRIES
+
+    def get_key(self, filename: str, handler_name: str) -> str:
+        """Returns the cache key of the specified file parsed with the specified handler"""
+        hash_ = hashlib.sha256()
+        with open(filename, "rb") as file:
+            for block in iter(lambda: file.read(2**20), b""):
+                hash_.update(block)
+        hash_.update(f"{handler_name}:{CACHE_VERSION}".encode())
+        return hash_.hexdigest()
+
+    def load(self, key: str) -> Optional[List[str]]:
+        """Returns the note names stored under the key, or None if there are none"""
+        path = self._get_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                note_names = json.load(file)["note_names"]
+            os.utime(path)  # marks the entry as recently used
+        except (OSError, ValueError, KeyError):
+            return None
+        return note_names
+
+    def store(self, key: str, note_names: List[str]) -> None:
+        """Stores the note names under the key. Failing to write the cache is not fatal"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # written to a temporary file first, so concurrent runs never read partial files
+            with tempfile.NamedTemporaryFile(
+                "w", dir=self.directory, suffix=".tmp", delete=False, encoding="utf-8"
+            ) as file:
+                json.dump({"note_names": note_names}, file)
+            os.replace(file.name, self._get_path(key))
+            self._evict()
+        except OSError as exc:
+            logging.warning("Could not write parse cache: %s", exc)
+
+    def _evict(self) -> None:
+        # removes the least recently used entries beyond max_entries
+        paths = [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(".json")
+        ]
+        if len(paths) <= self.max_entries:
+            return
+        mtimes = {}
+        for path in paths:
+            try:
+                mtimes[path] = os.path.getmtime(path)
+            except OSError:  # removed by a concurrent run
+                pass
+        for path in sorted(mtimes, key=mtimes.get)[: max(len(mtimes) - self.max_entries, 0)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
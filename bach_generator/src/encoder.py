@@ -6,8 +6,23 @@ Created on Wed Sep 15 17:37:23 2021
 """
 import collections
 from dataclasses import dataclass, field
-from itertools import zip_longest
-from typing import Dict, List, Tuple
+from typing import Dict, List, Tuple, Union
+
+import numpy
+
+# upper bound for the amount of outputs quantized at once by Quantizer.quantize_matrix
+QUANTIZE_BLOCK_ELEMENTS = 2**16
+
+
+def get_first_appearances(
+    values: numpy.ndarray, positions: numpy.ndarray, bins: int, default: int
+) -> numpy.ndarray:
+    """Returns the smallest position at which each value between 0 and bins appears,
+    or the default for values that do not appear
+    """
+    first_appearances = numpy.full(bins, default)
+    numpy.minimum.at(first_appearances, values, positions)
+    return first_appearances
 
 
 @dataclass
@@ -48,30 +63,95 @@ class Quantizer:
             *collections.Counter(encoded_notes).most_common()
         )
 
+    @property
+    def encodings(self) -> int:
+        """The number of distinct encoded notes that outputs are quantized to"""
+        return len(self._sorted_encoded_notes)
+
     def quantize(self, outputs: List[float]) -> List[int]:
         """Quantizes a list of floats into a list of ints based on its frequency
         relative to the sorted_encoded_notes set using the setup method.
         """
         if not outputs or not self._sorted_encoded_notes:
             return []
+        return self.quantize_array(numpy.asarray(outputs, dtype=float)).tolist()
 
-        # map outputs to values between 0 and the total number of possible encodings
-        min_ = min(outputs)
-        grounded_outputs = [output - min_ for output in outputs]
-        scaling = max(grounded_outputs) / len(self._sorted_encoded_notes)
-        mapped_outputs: List[int] = [
-            round(output / scaling) if scaling != 0 else 0
-            for output in grounded_outputs
-        ]
+    def quantize_array(self, outputs: numpy.ndarray) -> numpy.ndarray:
+        """Quantizes a 1D array of floats into an array of ints, see quantize"""
+        if not outputs.size or not self._sorted_encoded_notes:
+            return numpy.zeros(0, dtype=int)
+        return self.quantize_matrix(outputs.reshape(1, -1))[0]
+
+    def quantize_matrix(self, outputs: numpy.ndarray) -> numpy.ndarray:
+        """Quantizes every row of a (models x notes) matrix of floats at once.
+        In each row, the output values are ranked by frequency of appearance,
+        ties broken by first appearance, and the n-th most frequent output value
+        is mapped to the n-th most frequent input note (or 0 if there are more
+        output values), just like quantize does for a single list.
+        """
+        rows, columns = outputs.shape
+        if not outputs.size or not self._sorted_encoded_notes:
+            return numpy.zeros(shape=(rows, 0), dtype=int)
 
-        # match values from input to output by frequency of appearance
-        sorted_outputs, _ = zip(*collections.Counter(mapped_outputs).most_common())
-        output_mapping = dict(
-            zip_longest(
-                sorted_outputs,
-                self._sorted_encoded_notes[: len(sorted_outputs)],
-                fillvalue=0,
+        # blocks of rows are quantized at once, small enough to stay in the cpu cache
+        block_size = max(1, QUANTIZE_BLOCK_ELEMENTS // columns)
+        quantized_outputs = numpy.empty(shape=(rows, columns), dtype=int)
+        for i in range(0, rows, block_size):
+            quantized_outputs[i : i + block_size] = self._quantize_block(
+                outputs[i : i + block_size]
             )
-        )
-        quantized_outputs = [output_mapping[note] for note in mapped_outputs]
         return quantized_outputs
+
+    def _quantize_block(self, outputs: numpy.ndarray) -> numpy.ndarray:
+        rows, columns = outputs.shape
+        mapped_outputs = self.map_outputs(
+            outputs,
+            outputs.min(axis=1, keepdims=True),
+            outputs.max(axis=1, keepdims=True),
+        )
+
+        # count values of all rows at once by giving each row its own range of bins
+        bins = int(mapped_outputs.max()) + 1
+        binned_outputs = (mapped_outputs + numpy.arange(rows)[:, None] * bins).ravel()
+        counts = numpy.bincount(binned_outputs, minlength=rows * bins)
+        first_appearances = get_first_appearances(
+            binned_outputs, numpy.tile(numpy.arange(columns), rows), rows * bins, columns
+        )
+
+        output_mapping = self.match_frequencies(
+            counts.reshape(rows, bins), first_appearances.reshape(rows, bins)
+        )
+        return output_mapping.ravel()[binned_outputs].reshape(rows, columns)
+
+    def map_outputs(
+        self,
+        outputs: numpy.ndarray,
+        minimum: Union[float, numpy.ndarray],
+        maximum: Union[float, numpy.ndarray],
+    ) -> numpy.ndarray:
+        """Maps outputs to ints between 0 and the total number of possible encodings,
+        given the minimum and maximum of all outputs they belong to.
+        """
+        scaling = (maximum - minimum) / len(self._sorted_encoded_notes)
+        # with zero scaling all outputs are equal to the minimum, so dividing by 1 keeps them
+        scaling = numpy.where(scaling == 0, 1, scaling)
+        return numpy.rint((outputs - minimum) / scaling).astype(int)
+
+    def match_frequencies(
+        self, counts: numpy.ndarray, first_appearances: numpy.ndarray
+    ) -> numpy.ndarray:
+        """Matches the mapped output values to input notes by frequency of appearance.
+        Takes the count and first appearance of every mapped value (column) for each row
+        and returns the encoded note that each mapped value is quantized to in that row.
+        """
+        rows, bins = counts.shape
+        row_indices = numpy.repeat(numpy.arange(rows), bins)
+        sorted_bins = numpy.lexsort(
+            (first_appearances.ravel(), -counts.ravel(), row_indices)
+        )
+        ranks = numpy.empty(rows * bins, dtype=int)
+        ranks[sorted_bins] = numpy.tile(numpy.arange(bins), rows)
+        sorted_notes = numpy.zeros(bins, dtype=int)
+        notes = self._sorted_encoded_notes[:bins]
+        sorted_notes[: len(notes)] = notes
+        return sorted_notes[ranks].reshape(rows, bins)
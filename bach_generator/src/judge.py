@@ -4,17 +4,79 @@ Created on Wed Sep 15 17:34:59 2021
 
 @author: richa
 """
-# pylint: disable=too-few-public-methods
+from dataclasses import dataclass, field
 from typing import List
 
-from scipy import stats
+import numpy
 
 
+@dataclass
 class Judge:
     """Judges a model manager"""
 
+    _normalized_inputs: numpy.ndarray = field(
+        default_factory=lambda: numpy.zeros(0), init=False
+    )
+    _inputs_norm: float = field(default=0.0, init=False)
+
+    def setup(self, encoded_inputs: List[int]) -> None:
+        """Precomputes the input statistics used by rate_all and rate_histogram"""
+        if not encoded_inputs:
+            self._normalized_inputs = numpy.zeros(0)
+            self._inputs_norm = 0.0
+            return
+        centered_inputs = numpy.asarray(encoded_inputs, dtype=float)
+        centered_inputs -= centered_inputs.mean()
+        self._inputs_norm = float(numpy.linalg.norm(centered_inputs))
+        self._normalized_inputs = (
+            centered_inputs / self._inputs_norm if self._inputs_norm else centered_inputs
+        )
+
     @staticmethod
     def rate(encoded_inputs: List[int], encoded_outputs: List[int]) -> float:
         """Sets the manager rating to the correlation between the inputs and the outputs"""
+        from scipy import stats  # pylint: disable=import-outside-toplevel
+
         rating, _ = stats.pearsonr(encoded_inputs, encoded_outputs)
         return rating
+
+    def rate_all(self, encoded_outputs: numpy.ndarray) -> numpy.ndarray:
+        """Rates every row of a (models x notes) matrix of encoded outputs at once by its
+        correlation with the inputs passed to the setup method, like rate does.
+        Rows that are constant (or constant inputs) are rated nan.
+        """
+        if encoded_outputs.shape[1] != len(self._normalized_inputs):
+            raise ValueError("The inputs and outputs must have the same length")
+        if encoded_outputs.shape[1] < 2:
+            raise ValueError("The inputs and outputs must have a length of at least 2")
+
+        centered_outputs = encoded_outputs - encoded_outputs.mean(axis=1, keepdims=True)
+        norms = numpy.linalg.norm(centered_outputs, axis=1)
+        constant_rows = (encoded_outputs == encoded_outputs[:, :1]).all(axis=1)
+        if not self._normalized_inputs.any():
+            constant_rows[:] = True
+        norms[constant_rows] = 1
+        ratings = numpy.dot(centered_outputs, self._normalized_inputs) / norms
+        ratings[constant_rows] = numpy.nan
+        return numpy.clip(ratings, -1, 1)
+
+    def rate_histogram(
+        self, notes: numpy.ndarray, counts: numpy.ndarray, input_sums: numpy.ndarray
+    ) -> float:
+        """Rates outputs summarized as a histogram by their correlation with the inputs
+        passed to the setup method, like rate does. For every bin, takes its output note,
+        its count and the sum of the inputs at the positions of its outputs.
+        """
+        length = int(counts.sum())
+        if length != len(self._normalized_inputs):
+            raise ValueError("The inputs and outputs must have the same length")
+        if length < 2:
+            raise ValueError("The inputs and outputs must have a length of at least 2")
+        if not self._inputs_norm or numpy.unique(notes[counts > 0]).size < 2:
+            return numpy.nan
+
+        deviations = notes - numpy.dot(counts, notes) / length
+        # the deviations sum up to zero, so the input mean drops out of the covariance
+        covariance = numpy.dot(deviations, input_sums)
+        outputs_norm = numpy.sqrt(numpy.dot(counts, deviations**2))
+        return float(numpy.clip(covariance / (outputs_norm * self._inputs_norm), -1, 1))
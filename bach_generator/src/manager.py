@@ -10,11 +10,29 @@ from __future__ import annotations
 import collections
 import copy
 from dataclasses import dataclass, field
-from typing import Deque, List
+from typing import Deque, List, Optional
+
+import numpy
 
 from bach_generator.src.encoder import Encoder, Quantizer
 from bach_generator.src.judge import Judge
-from bach_generator.src.model import JumbleStrategy, Model
+from bach_generator.src.model import JumbleStrategy, Model, jumble_with_seed
+
+
+@dataclass
+class CloneOrigin:
+    """Describes a clone by the model it was cloned from and how the copy gets jumbled"""
+
+    model: Model
+    seed: int
+    jumble_strategy: JumbleStrategy
+    weight_divergence: float
+
+    def construct_model(self) -> Model:
+        """Constructs the jumbled copy of the model"""
+        return jumble_with_seed(
+            self.model, self.jumble_strategy, self.weight_divergence, self.seed
+        )
 
 
 @dataclass
@@ -22,8 +40,10 @@ class ModelManager:
     """Encodes contents of an input file, sets up and runs the model and decodes its contents"""
 
     rating: float = 0.0
+    rated: bool = field(default=False, init=False)
     encoded_outputs: List[int] = field(default_factory=list, init=False)
     decoded_outputs: List[str] = field(default_factory=list, init=False)
+    origin: Optional[CloneOrigin] = field(default=None, init=False)
 
     def __init__(self, inputs: int, outputs: int, layers: int, layer_size: int):
         self.model = Model(inputs, outputs)
@@ -31,6 +51,19 @@ class ModelManager:
             self.model.add_layer(layer_size)
         self.model.build()
 
+    @property
+    def model(self) -> Model:
+        """Getter for the model. Clones from clone_with_seed construct it on first access"""
+        if self.origin is not None:
+            self._model = self.origin.construct_model()
+            self.origin = None
+        return self._model
+
+    @model.setter
+    def model(self, model: Model) -> None:
+        self._model = model
+        self.origin = None
+
     @classmethod
     def construct_with_model(cls, model: Model) -> ModelManager:
         """Constructs a new ModelManager with the specified model"""
@@ -38,8 +71,20 @@ class ModelManager:
         model_manager.model = model
         return model_manager
 
-    def run_model(self, inputs: List[int], quantizer: Quantizer) -> None:
-        """Runs the model with the specified inputs and stores the outputs"""
+    def run_model(
+        self,
+        inputs: List[int],
+        quantizer: Quantizer,
+        input_windows: Optional[numpy.ndarray] = None,
+    ) -> None:
+        """Runs the model with the specified inputs and stores the outputs.
+        If the matrix of input windows is passed (see model.construct_input_windows),
+        the whole sequence is computed at once instead of note by note.
+        """
+        if input_windows is not None:
+            self.quantize_outputs(self.model.compute_windows(input_windows), quantizer)
+            return
+
         encoded_outputs: List[float] = []
         input_deque: Deque[int] = collections.deque(maxlen=self.model.inputs)
         for input_ in inputs:
@@ -48,6 +93,12 @@ class ModelManager:
             encoded_outputs.extend(model_outputs)
         self.encoded_outputs = quantizer.quantize(encoded_outputs)
 
+    def quantize_outputs(
+        self, model_outputs: numpy.ndarray, quantizer: Quantizer
+    ) -> None:
+        """Quantizes the model outputs computed for all inputs and stores them"""
+        self.encoded_outputs = quantizer.quantize_array(model_outputs.ravel()).tolist()
+
     def clone(
         self, jumble_strategy: JumbleStrategy, weight_divergence: float
     ) -> ModelManager:
@@ -56,12 +107,38 @@ class ModelManager:
         """
         copied_manager = copy.deepcopy(self)
         copied_manager.model.jumble(jumble_strategy, weight_divergence)
+        copied_manager.rated = False
         return copied_manager
 
+    def clone_with_seed(
+        self, jumble_strategy: JumbleStrategy, weight_divergence: float, seed: int
+    ) -> ModelManager:
+        """Clones itself without copying the model yet. The clone is only described by its
+        origin (the model, the seed and the jumble parameters), from which the jumbled model
+        copy is constructed when first accessed, or anywhere else, e.g. in a worker process.
+        """
+        model_manager = ModelManager.construct_with_model(self.model)
+        model_manager.origin = CloneOrigin(
+            self.model, seed, jumble_strategy, weight_divergence
+        )
+        model_manager.rating = self.rating
+        return model_manager
+
     def decode_outputs(self, decoder: Encoder) -> None:
         """Decodes its encoded_outputs using the passed decoder and stores the results"""
         self.decoded_outputs = decoder.decode(self.encoded_outputs)
 
+    def set_result(
+        self, rating: float, encoded_outputs: Optional[List[int]] = None
+    ) -> None:
+        """Stores a rating computed elsewhere, e.g. in a worker process. Outputs that were
+        not passed along are discarded, as they no longer match the rating.
+        """
+        self.rating = rating
+        self.rated = True
+        self.encoded_outputs = encoded_outputs if encoded_outputs is not None else []
+
     def get_rated_by(self, judge: Judge, encoded_inputs: List[int]) -> None:
         """Sets self.rating to the rating returned by the judge on encoded inputs and outputs"""
         self.rating = judge.rate(encoded_inputs, self.encoded_outputs)
+        self.rated = True
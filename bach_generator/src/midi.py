@@ -0,0 +1,416 @@
+# -*- coding: utf-8 -*-
+"""Reads and writes notes straight from and to standard MIDI files, without constructing
+music21 streams.
+
+extract_note_names mirrors what music21 does to the notes of a MIDI file before the music
+handlers pick them out: chord detection, quantization of offsets and durations, and ties
+at barlines (which repeat the name of a note for every measure it extends into). Files
+whose translation also depends on anything else raise an UnsupportedMidiError, so the
+caller can fall back to music21. encode_midi writes (pitch, offset, quarter length) notes
+into a single track.
+"""
+
+import math
+import re
+import struct
+from dataclasses import dataclass, field
+from fractions import Fraction
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+# spelling of the pitch classes used by music21 for midi pitches
+PITCH_NAMES = ("C", "C#", "D", "E-", "E", "F", "F#", "G", "G#", "A", "B-", "B")
+
+# quantization units used by music21 when reading midi files (1/4 and 1/3 quarter notes)
+QUARTER_LENGTH_DIVISORS = (4, 3)
+DENOMINATOR_LIMIT = 65535
+PERCUSSION_CHANNEL = 9
+# resolution and velocity of the midi files written by music21
+TICKS_PER_QUARTER = 10080
+NOTE_VELOCITY = 90
+
+PITCH_STEPS = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+ACCIDENTALS = {"": 0, "#": 1, "##": 2, "-": -1, "--": -2}
+# the flats are matched lazily, so that a minus sign before the octave is read as its sign
+NOTE_NAME_PATTERN = re.compile(r"([A-G])(#{0,2}|-{0,2}?)(-[1-9]\d*|\d+)")
+
+NOTE_OFF = 0x80
+NOTE_ON = 0x90
+PROGRAM_CHANGE = 0xC0
+META_EVENT = 0xFF
+TRACK_NAME = 0x03
+INSTRUMENT_NAME = 0x04
+SET_TEMPO = 0x51
+TIME_SIGNATURE = 0x58
+KEY_SIGNATURE = 0x59
+END_OF_TRACK = 0x2F
+# meta events that music21 turns into objects in the part of the track
+OBJECT_META_EVENTS = (TRACK_NAME, INSTRUMENT_NAME, SET_TEMPO, TIME_SIGNATURE, KEY_SIGNATURE)
+
+# number of data bytes of channel messages by status (high nibble)
+DATA_LENGTHS = {0x80: 2, 0x90: 2, 0xA0: 2, 0xB0: 2, 0xC0: 1, 0xD0: 1, 0xE0: 2}
+
+QuarterLength = Union[float, Fraction]
+# (pitch, offset, quarter length) of a note to write
+OutputNote = Tuple[int, QuarterLength, QuarterLength]
+
+
+class UnsupportedMidiError(ValueError):
+    """Raised for MIDI files that the fast reader cannot translate like music21 does"""
+
+
+@dataclass
+class MidiNote:
+    """Note read from a midi track, with times in ticks"""
+
+    start: int
+    end: int
+    pitch: int
+    channel: int
+
+    @property
+    def name(self) -> str:
+        """The note name with octave, e.g. C#4"""
+        return f"{PITCH_NAMES[self.pitch % 12]}{self.pitch // 12 - 1}"
+
+
+@dataclass
+class MidiTrack:
+    """Events of a midi track that are relevant for extracting its notes"""
+
+    notes: List[MidiNote] = field(default_factory=list)
+    time_signatures: List[Tuple[int, int, int]] = field(default_factory=list)
+    has_note_on: bool = False
+    has_late_objects: bool = False
+
+
+def read_midi(data: bytes) -> Tuple[int, List[MidiTrack]]:
+    """Reads the ticks per quarter note and the tracks of a standard midi file"""
+    chunks = dict(_iterate_chunks(data))
+    if b"MThd" not in chunks:
+        raise UnsupportedMidiError("Missing midi header chunk")
+    try:
+        _, _, division = struct.unpack(">HHH", chunks[b"MThd"][0][:6])
+        if division & 0x8000:
+            raise UnsupportedMidiError("SMPTE time division is not supported")
+        return division, [_read_track(chunk) for chunk in chunks.get(b"MTrk", [])]
+    except (IndexError, struct.error) as exc:
+        raise UnsupportedMidiError("Truncated midi file") from exc
+
+
+def note_name_to_pitch(name: str) -> int:
+    """Returns the midi pitch of a note name with octave, e.g. 61 for C#4.
+    Negative octaves are written like music21 does, e.g. C-1 for 0 and B--1 for 10,
+    a minus sign before the octave is only read as a flat if the pitch would be negative
+    otherwise, e.g. 71 for C-5. Names music21 gives two pitches, like E-1 for 4 and 27,
+    are read with the negative octave.
+    """
+    match = NOTE_NAME_PATTERN.fullmatch(name)
+    if match is None:
+        raise ValueError(f"Invalid note name: {name}")
+    step, accidental, octave = match.groups()
+    pitch = 12 * (int(octave) + 1) + PITCH_STEPS[step] + ACCIDENTALS[accidental]
+    if pitch < 0 and octave.startswith("-") and accidental + "-" in ACCIDENTALS:
+        pitch = 12 * (int(octave[1:]) + 1) + PITCH_STEPS[step] + ACCIDENTALS[accidental + "-"]
+    if pitch < 0:
+        raise ValueError(f"Invalid note name: {name}")
+    return pitch
+
+
+def encode_midi(notes: Iterable[OutputNote], ticks_per_quarter: int = TICKS_PER_QUARTER) -> bytes:
+    """Returns the bytes of a single track midi file with the (pitch, offset, quarter length)
+    notes, with offsets and quarter lengths in quarter notes.
+    """
+    # (tick, is_note_on, pitch): note offs come before note ons at the same tick
+    events: List[Tuple[int, bool, int]] = []
+    for pitch, offset, quarter_length in notes:
+        events.append((round(offset * ticks_per_quarter), True, pitch))
+        events.append((round((offset + quarter_length) * ticks_per_quarter), False, pitch))
+    events.sort()
+
+    track = bytearray()
+    tick = 0
+    for event_tick, is_note_on, pitch in events:
+        track += _encode_variable_length(event_tick - tick)
+        if is_note_on:
+            track += bytes((NOTE_ON, pitch, NOTE_VELOCITY))
+        else:
+            track += bytes((NOTE_OFF, pitch, 0))
+        tick = event_tick
+    track += bytes((0, META_EVENT, END_OF_TRACK, 0))
+    header = struct.pack(">HHH", 0, 1, ticks_per_quarter)
+    return _encode_chunk(b"MThd", header) + _encode_chunk(b"MTrk", bytes(track))
+
+
+def write_midi(filename: str, notes: Iterable[OutputNote]) -> None:
+    """Writes the (pitch, offset, quarter length) notes to a midi file"""
+    with open(filename, "wb") as file:
+        file.write(encode_midi(notes))
+
+
+def extract_note_names(filename: str) -> List[str]:
+    """Returns the names of the notes of the single part of a midi file,
+    in the same order as music21 parses them.
+    """
+    return [name for name, _, _ in extract_notes(filename)]
+
+
+def extract_notes(filename: str) -> List[Tuple[str, QuarterLength, QuarterLength]]:
+    """Returns (name, offset, quarter length) of the notes of the single part of a midi
+    file, in the same order as music21 parses them.
+    """
+    with open(filename, "rb") as file:
+        ticks_per_quarter, tracks = read_midi(file.read())
+
+    note_tracks = [track for track in tracks if track.has_note_on]
+    if len(note_tracks) != 1:
+        raise UnsupportedMidiError("Only files with a single track of notes are supported")
+    track = note_tracks[0]
+    if track.has_late_objects:
+        raise UnsupportedMidiError("Tempo, key, time or instrument changes are not supported")
+    if any(note.channel == PERCUSSION_CHANNEL for note in track.notes):
+        raise UnsupportedMidiError("Percussion notes are not supported")
+    if any(note.start == note.end for note in track.notes):
+        raise UnsupportedMidiError("Notes without duration (grace notes) are not supported")
+
+    # time signatures of the conductor track(s) take precedence over the part's own ones
+    conductor_signatures = [
+        signature
+        for track_ in tracks
+        if not track_.has_note_on
+        for signature in track_.time_signatures
+    ]
+    bars = _iterate_bars(conductor_signatures or track.time_signatures, ticks_per_quarter)
+    elements = _group_notes(track.notes, ticks_per_quarter)
+    notes = [
+        (note.name, offset, offset + quarter_length)
+        for note, offset, quarter_length in _quantize(elements, ticks_per_quarter)
+        if note is not None  # chords are skipped
+    ]
+    return [
+        (name, _op_frac(start), _op_frac(end - start))
+        for name, start, end in _tie_notes(notes, bars)
+    ]
+
+
+def _tie_notes(
+    notes: List[Tuple[str, Fraction, Fraction]], bars: Iterator[Tuple[Fraction, Fraction]]
+) -> List[Tuple[str, Fraction, Fraction]]:
+    """Splits the notes at barlines and returns the pieces bar by bar. Like in the measures
+    of music21, notes starting at a barline come before the tied notes, which keep the
+    order they had in the previous bar.
+    """
+    pieces: List[Tuple[str, Fraction, Fraction]] = []
+    tied_notes: List[Tuple[str, Fraction, Fraction]] = []
+    index = 0
+    while index < len(notes) or tied_notes:
+        start, end = next(bars)
+        bar_notes = []
+        while index < len(notes) and notes[index][1] < end:
+            bar_notes.append(notes[index])
+            index += 1
+        starting_notes = [note for note in bar_notes if note[1] == start]
+        later_notes = [note for note in bar_notes if note[1] != start]
+
+        next_tied_notes = []
+        for name, note_start, note_end in starting_notes + tied_notes + later_notes:
+            pieces.append((name, note_start, min(note_end, end)))
+            if note_end > end:
+                next_tied_notes.append((name, end, note_end))
+        tied_notes = next_tied_notes
+    return pieces
+
+
+def _iterate_bars(
+    time_signatures: List[Tuple[int, int, int]], ticks_per_quarter: int
+) -> Iterator[Tuple[Fraction, Fraction]]:
+    """Yields the start and end offsets of all bars, given the time signatures"""
+    # time signatures are quantized like all other elements by music21
+    bar_lengths: Dict[Fraction, Fraction] = {
+        Fraction(_quantize_offset(tick / ticks_per_quarter)): Fraction(4 * numerator, denominator)
+        for tick, numerator, denominator in time_signatures
+    }
+    start = Fraction(0)
+    bar_length = bar_lengths.get(start, Fraction(4))
+    while True:
+        end = start + bar_length
+        if any(start < offset < end for offset in bar_lengths):
+            raise UnsupportedMidiError("Time signatures in the middle of a bar")
+        yield start, end
+        start, bar_length = end, bar_lengths.get(end, bar_length)
+
+
+def _iterate_chunks(data: bytes) -> Iterator[Tuple[bytes, List[bytes]]]:
+    chunks: Dict[bytes, List[bytes]] = {}
+    position = 0
+    while position + 8 <= len(data):
+        chunk_type = data[position : position + 4]
+        (length,) = struct.unpack(">I", data[position + 4 : position + 8])
+        chunks.setdefault(chunk_type, []).append(data[position + 8 : position + 8 + length])
+        position += 8 + length
+    yield from chunks.items()
+
+
+def _encode_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return chunk_type + struct.pack(">I", len(data)) + data
+
+
+def _encode_variable_length(value: int) -> bytes:
+    data = bytearray((value & 0x7F,))
+    value >>= 7
+    while value:
+        data.insert(0, value & 0x7F | 0x80)
+        value >>= 7
+    return bytes(data)
+
+
+def _read_variable_length(data: bytes, position: int) -> Tuple[int, int]:
+    value = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            return value, position
+
+
+def _read_track(data: bytes) -> MidiTrack:
+    track = MidiTrack()
+    # note ons and offs in order, as (tick, is_note_on, pitch, channel)
+    note_events: List[Tuple[int, bool, int, int]] = []
+    tick, position, status = 0, 0, 0
+    while position < len(data):
+        delta, position = _read_variable_length(data, position)
+        tick += delta
+        if data[position] & 0x80:
+            status = data[position]
+            position += 1
+
+        if status == META_EVENT:
+            meta_type = data[position]
+            length, position = _read_variable_length(data, position + 1)
+            meta_data = data[position : position + length]
+            position += length
+            if meta_type == TIME_SIGNATURE and len(meta_data) >= 2:
+                track.time_signatures.append((tick, meta_data[0], 2 ** meta_data[1]))
+            if meta_type in OBJECT_META_EVENTS and tick > 0:
+                track.has_late_objects = True
+            continue
+        if status in (0xF0, 0xF7):  # system exclusive
+            length, position = _read_variable_length(data, position)
+            position += length
+            continue
+
+        message, channel = status & 0xF0, status & 0x0F
+        if message not in DATA_LENGTHS:
+            raise UnsupportedMidiError(f"Invalid midi status byte {status}")
+        message_data = data[position : position + DATA_LENGTHS[message]]
+        position += DATA_LENGTHS[message]
+        if message == PROGRAM_CHANGE and tick > 0:
+            track.has_late_objects = True
+        elif message == NOTE_ON and message_data[1] > 0:
+            track.has_note_on = True
+            note_events.append((tick, True, message_data[0], channel))
+        elif message in (NOTE_ON, NOTE_OFF):
+            note_events.append((tick, False, message_data[0], channel))
+
+    track.notes = _pair_note_events(note_events)
+    return track
+
+
+def _pair_note_events(note_events: List[Tuple[int, bool, int, int]]) -> List[MidiNote]:
+    # like music21, each note on ends at the next note off of its pitch and channel
+    note_off_ticks: Dict[Tuple[int, int], int] = {}
+    notes: List[MidiNote] = []
+    for tick, is_note_on, pitch, channel in reversed(note_events):
+        if not is_note_on:
+            note_off_ticks[pitch, channel] = tick
+        elif (pitch, channel) in note_off_ticks:
+            notes.append(MidiNote(tick, note_off_ticks[pitch, channel], pitch, channel))
+    return notes[::-1]
+
+
+def _group_notes(
+    notes: List[MidiNote], ticks_per_quarter: int
+) -> List[Tuple[Optional[MidiNote], int, int]]:
+    """Returns (note, start, end) for notes and (None, start, end) for chords,
+    gathering notes that start and end within a quantization unit like music21.
+    """
+    tolerance = ticks_per_quarter / max(QUARTER_LENGTH_DIVISORS)
+    elements: List[Tuple[Optional[MidiNote], int, int]] = []
+    gathered = [False] * len(notes)
+    for i, note in enumerate(notes):
+        if gathered[i]:
+            continue
+        chord_size = 1
+        for j in range(i + 1, len(notes)):
+            if abs(notes[j].start - note.start) >= tolerance:
+                break
+            if abs(notes[j].end - note.end) > tolerance:
+                raise UnsupportedMidiError("Notes that require multiple voices")
+            gathered[j] = True
+            chord_size += 1
+        elements.append((note if chord_size == 1 else None, note.start, note.end))
+    return elements
+
+
+def _quantize(
+    elements: List[Tuple[Optional[MidiNote], int, int]], ticks_per_quarter: int
+) -> Iterator[Tuple[Optional[MidiNote], Fraction, Fraction]]:
+    """Yields the elements with quantized offsets and durations (in quarter lengths).
+    Like music21, the duration of an element is quantized to fill the gap to the next
+    element wherever possible.
+    """
+    offsets = [
+        _quantize_offset(_op_frac(start / ticks_per_quarter)) for _, start, _ in elements
+    ]
+    next_index = 0
+    for i, (element, start, end) in enumerate(elements):
+        offset = _op_frac(offsets[i])
+        quarter_length = float(_op_frac((end - start) / ticks_per_quarter))
+        # the quantized offsets do not decrease, so the next greater one is found in order
+        next_index = max(next_index, i + 1)
+        while next_index < len(offsets) and offsets[next_index] <= offsets[i]:
+            next_index += 1
+        if next_index == len(offsets):
+            duration = _find_best_match(quarter_length, zero_allowed=False)
+        else:
+            gap = _op_frac(offsets[next_index] - offset)
+            duration = _find_best_match(quarter_length, zero_allowed=False, gap=gap)
+        yield element, Fraction(offset), Fraction(_op_frac(duration))
+
+
+def _quantize_offset(offset: QuarterLength) -> float:
+    return _find_best_match(float(offset), zero_allowed=True)
+
+
+def _find_best_match(
+    target: float, zero_allowed: bool, gap: QuarterLength = 0.0
+) -> float:
+    # replicates the float arithmetic of music21 (Stream.quantize and nearestMultiple)
+    matches = []
+    for divisor in QUARTER_LENGTH_DIVISORS:
+        unit = 1 / divisor
+        multiple = math.floor(target / unit)
+        low, high = unit * multiple, unit * (multiple + 1)
+        if low <= target <= low + unit / 2.0:
+            match, error = low, round(target - low, 7)
+        else:
+            match, error = high, round(high - target, 7)
+        if not zero_allowed and match == 0.0:
+            match = unit
+            error = abs(round(target - match, 7))
+        remaining_gap = 0.0 if gap % unit == 0 else max(gap - match, 0.0)
+        matches.append((remaining_gap, error, unit, match))
+    return min(matches)[3]
+
+
+def _op_frac(value: QuarterLength) -> QuarterLength:
+    # like music21.common.opFrac: offsets are floats if exact, otherwise fractions
+    if isinstance(value, float):
+        numerator, denominator = value.as_integer_ratio()
+        if denominator <= DENOMINATOR_LIMIT:
+            return value
+        value = Fraction(numerator, denominator).limit_denominator(DENOMINATOR_LIMIT)
+    if value.denominator & (value.denominator - 1) == 0:
+        return value.numerator / value.denominator
+    return value
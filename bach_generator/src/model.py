@@ -7,13 +7,38 @@ Created on Tue Sep 14 17:25:02 2021
 
 from __future__ import annotations
 
+import copy
+import functools
+import itertools
 import json
+import math
 import random
+import struct
 from dataclasses import dataclass
-from typing import Callable, Iterable, List, Optional
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+)
 
 import numpy
 
+# binary model format, see save_models_binary
+BINARY_MAGIC = b"BACHMDL\x00"
+BINARY_VERSION = 2
+# version 1 files have no offsets and ratings in their header
+SUPPORTED_BINARY_VERSIONS = (1, 2)
+BINARY_DTYPE = "<f8"
+BINARY_ALIGNMENT = 64
+# characters read at once when reading json model files incrementally
+JSON_CHUNK_SIZE = 2**16
+
 
 class MatrixLayer:
     """Neural network layer that manages weight matrices connected to other layers"""
@@ -40,6 +65,15 @@ class MatrixLayer:
         self._matrix = numpy.concatenate(columns, axis=0)
         self.length = self._matrix.shape[0]
 
+    def serialize_matrix(self) -> numpy.ndarray:
+        """Serializes the layer as a (nodes x weights) matrix"""
+        return self._matrix
+
+    def deserialize_matrix(self, matrix: numpy.ndarray) -> None:
+        """Deserializes the passed (nodes x weights) matrix, which is used without copying"""
+        self._matrix = matrix
+        self.length = matrix.shape[0]
+
     def connect(self, layer: MatrixLayer):
         """Connects specified layer to itself"""
         self._connected_layer = layer
@@ -74,6 +108,10 @@ class MatrixLayer:
 
         self._values = numpy.dot(values, self._matrix)
 
+    def as_matrix(self) -> numpy.ndarray:
+        """Returns the weight matrix of the layer"""
+        return self._matrix
+
     def propagate(self):
         """Propagates own values to connected layer"""
         if not self._connected_layer:
@@ -106,6 +144,14 @@ class Layer:
             node.deserialize(weights)
             self.nodes.append(node)
 
+    def serialize_matrix(self) -> numpy.ndarray:
+        """Serializes the layer as a (nodes x weights) matrix"""
+        return numpy.array(self.serialize(), dtype=numpy.float64).reshape(len(self.nodes), -1)
+
+    def deserialize_matrix(self, matrix: numpy.ndarray) -> None:
+        """Deserializes the passed (nodes x weights) matrix"""
+        self.deserialize(matrix.tolist())
+
     def connect(self, layer: Layer):
         """Connects specified layer to itself, then connects all nodes of the specified layer
         with all its nodes.
@@ -125,6 +171,31 @@ class Layer:
         for node in self.nodes:
             node.jumble(jumble_strategy, weight_divergence)
 
+    def as_matrix(self) -> numpy.ndarray:
+        """Compiles the layer into a matrix mapping its node values to the node values of the
+        connected layer. Reproduces the averaging in Node.propagate by dividing each column by
+        the amount of values the connected node receives. Without connected layer, the matrix
+        maps the node values onto themselves.
+        Raises ValueError if a node is connected to nodes outside of the connected layer.
+        """
+        if not self._connected_layer:
+            return numpy.identity(len(self.nodes))
+
+        columns = {
+            id(node): column for column, node in enumerate(self._connected_layer.nodes)
+        }
+        matrix = numpy.zeros(shape=(len(self.nodes), len(columns)))
+        counts = numpy.zeros(shape=len(columns))
+        for row, node in enumerate(self.nodes):
+            connected_nodes = node._connected_nodes  # pylint: disable=protected-access
+            for weight, connected_node in zip(node.weights, connected_nodes):
+                column = columns.get(id(connected_node))
+                if column is None:
+                    raise ValueError("Cannot compile node connected outside of layer")
+                matrix[row, column] += weight
+                counts[column] += 1
+        return numpy.divide(matrix, counts, out=matrix, where=counts > 0)
+
     def set_values(self, values: Iterable[int]):
         """Sets value of nodes to specified values"""
         for node, value in zip(self.nodes, values):
@@ -153,6 +224,7 @@ class Model:
 
     def __post_init__(self):
         self._layers: List[Layer] = [self.layer_class(self.inputs)]
+        self._effective_weights: Optional[numpy.ndarray] = None
 
     @classmethod
     def construct_from_list(cls, layers: List[List[List[float]]]) -> Model:
@@ -175,9 +247,30 @@ class Model:
             layer = self.layer_class(length=len(layer_list))
             layer.deserialize(layer_list)
             self._layers.append(layer)
+        self._connect_deserialized_layers(inputs=len(layers[0]), outputs=len(layers[-1]))
+
+    def serialize_matrices(self) -> List[numpy.ndarray]:
+        """Serializes the model as one (nodes x weights) matrix per layer"""
+        return [layer.serialize_matrix() for layer in self._layers]
+
+    def deserialize_matrices(self, matrices: Sequence[numpy.ndarray]) -> None:
+        """Deserializes the passed (nodes x weights) layer matrices"""
+        if not matrices:
+            return
+
+        self._layers = []
+        for matrix in matrices:
+            layer = self.layer_class(length=matrix.shape[0])
+            layer.deserialize_matrix(matrix)
+            self._layers.append(layer)
+        self._connect_deserialized_layers(
+            inputs=matrices[0].shape[0], outputs=matrices[-1].shape[0]
+        )
 
-        self.inputs = len(layers[0])
-        self.outputs = len(layers[-1])
+    def _connect_deserialized_layers(self, inputs: int, outputs: int) -> None:
+        self.inputs = inputs
+        self.outputs = outputs
+        self._effective_weights = None
 
         for previous_layer, layer in zip(self._layers, self._layers[1:]):
             previous_layer.connect(layer)
@@ -189,26 +282,74 @@ class Model:
         new_layer = self.layer_class(length)
         self._layers[-1].connect(new_layer)
         self._layers.append(new_layer)
+        self._effective_weights = None
 
     def build(self):
         """Adds an output layer, then builds all layers"""
         self.add_layer(self.outputs)  # output layer
         for layer in self._layers:
             layer.build()
+        self._effective_weights = None
 
     def jumble(self, jumble_strategy: JumbleStrategy, weight_divergence: float):
         """Jumbles all layers with the weight_divergence specified"""
         for layer in self._layers:
             layer.jumble(jumble_strategy, weight_divergence)
+        self._effective_weights = None
 
     def compute(self, inputs: Iterable[int]) -> List[float]:
         """Sets values of input layer to the specified inputs, then propagates to other layers.
-        Returns values of the output layer"""
+        Returns values of the output layer. Models are computed using their effective weights
+        instead of propagating through each layer wherever possible.
+        """
+        weights = self.effective_weights
+        if weights is not None:
+            values = numpy.array(inputs, dtype=numpy.float64).reshape(1, -1)
+            return list(numpy.dot(fit_columns(values, weights.shape[0]), weights)[0])
+
         input_layer = self._layers[0]
         input_layer.set_values(inputs)
         input_layer.propagate()
         return self._layers[-1].values
 
+    @property
+    def weight_matrices(self) -> Optional[List[numpy.ndarray]]:
+        """Getter for the weight matrices of all layers. Object layers are compiled into
+        equivalent matrices (see Layer.as_matrix).
+        Returns None if a layer cannot be compiled.
+        """
+        try:
+            return [layer.as_matrix() for layer in self._layers]
+        except ValueError:
+            return None
+
+    @property
+    def effective_weights(self) -> Optional[numpy.ndarray]:
+        """Getter for the product of all layer weight matrices. As neither layer type applies
+        a nonlinearity, this single matrix is equivalent to the whole model. It is computed
+        lazily and cached until the weights change through the model.
+        Returns None if a layer cannot be compiled.
+        """
+        if self._effective_weights is None:
+            matrices = self.weight_matrices
+            if matrices is None:
+                return None
+            self._effective_weights = functools.reduce(numpy.dot, matrices)
+        return self._effective_weights
+
+    def compute_windows(self, windows: numpy.ndarray) -> numpy.ndarray:
+        """Computes the outputs for a matrix of input windows (see construct_input_windows),
+        returning one row of outputs per window. Models are computed with a single matrix
+        product of their effective weights wherever possible, otherwise window by window.
+        """
+        weights = self.effective_weights
+        if weights is None:
+            outputs = [self.compute(window) for window in windows]
+            if not outputs:
+                return numpy.zeros(shape=(0, self.outputs))
+            return numpy.array(outputs, dtype=numpy.float64)
+        return numpy.dot(fit_columns(windows, weights.shape[0]), weights)
+
 
 class Node:
     """Neural network node. Can be connected to other nodes.
@@ -267,6 +408,64 @@ class Node:
 JumbleStrategy = Callable[[Node, float], None]
 
 
+def jumble_with_seed(
+    model: Model, jumble_strategy: JumbleStrategy, weight_divergence: float, seed: int
+) -> Model:
+    """Returns a copy of the model jumbled with the specified jumble strategy and weight
+    divergence. The jumbled weights only depend on the seed, so that the same copy can be
+    reconstructed anywhere. The global random states are left unchanged.
+    """
+    copied_model = copy.deepcopy(model)
+    random_state = random.getstate()
+    numpy_random_state = numpy.random.get_state()
+    random.seed(seed)
+    numpy.random.seed(seed)
+    try:
+        copied_model.jumble(jumble_strategy, weight_divergence)
+    finally:
+        random.setstate(random_state)
+        numpy.random.set_state(numpy_random_state)
+    return copied_model
+
+
+def fit_columns(values: numpy.ndarray, width: int) -> numpy.ndarray:
+    """Pads the rows of the values matrix with zeros or truncates them to the specified width"""
+    if values.shape[1] >= width:
+        return values[:, :width]
+    padding = numpy.zeros(shape=(values.shape[0], width - values.shape[1]))
+    return numpy.concatenate((values, padding), axis=1)
+
+
+def construct_input_windows(inputs: Sequence[int], size: int) -> numpy.ndarray:
+    """Returns a matrix with one row per input, holding the last size inputs up to and
+    including that input. Like a filling deque, rows at the start of the sequence contain
+    fewer inputs and are zero-padded at the end.
+    """
+    values = numpy.asarray(inputs, dtype=numpy.float64)
+    size = max(size, 0)
+    positions = numpy.arange(values.size)
+    starts = numpy.maximum(positions - size + 1, 0)
+    indices = starts[:, numpy.newaxis] + numpy.arange(size)[numpy.newaxis, :]
+    mask = indices <= positions[:, numpy.newaxis]
+    windows = numpy.zeros(shape=(values.size, size))
+    windows[mask] = values[indices[mask]]
+    return windows
+
+
+def iterate_input_windows(
+    inputs: Sequence[int], size: int, chunk_size: int
+) -> Iterator[numpy.ndarray]:
+    """Yields the matrix of input windows (see construct_input_windows) in chunks of up to
+    chunk_size rows. The last size - 1 inputs of a chunk are carried over to the next one,
+    so the chunks make up the full matrix without it ever being constructed.
+    """
+    overlap = max(size - 1, 0)
+    for start in range(0, len(inputs), max(chunk_size, 1)):
+        head = max(start - overlap, 0)
+        windows = construct_input_windows(inputs[head : start + chunk_size], size)
+        yield windows[start - head :]
+
+
 def jumble_by_factor_strategy(node: Node, weight_divergence: float) -> None:
     """Jumbles all node weights by a random offset"""
     node.weights = [
@@ -298,8 +497,152 @@ def save_models(models: List[Model], filepath: str):
         json.dump([model.serialize() for model in models], file, indent=4)
 
 
-def load_models(filepath: str) -> List[Model]:
-    """Loads the models from the specified json filepath"""
+def save_models_binary(
+    models: List[Model], filepath: str, ratings: Optional[List[Optional[float]]] = None
+):
+    """Saves the models to the specified filepath in the binary model format: the magic
+    bytes, the length of a json header, the header, then the float64 weights of all layer
+    matrices in order, aligned to BINARY_ALIGNMENT bytes. The header indexes the models
+    with their layer matrix shapes, the byte offsets of their weights and their ratings,
+    so that the best models can be loaded without reading the others. Models that have
+    not been rated have a rating of None.
+    """
+    matrices = [model.serialize_matrices() for model in models]
+    shapes = [[matrix.shape for matrix in model_matrices] for model_matrices in matrices]
+    header = json.dumps(
+        {
+            "version": BINARY_VERSION,
+            "dtype": BINARY_DTYPE,
+            "shapes": shapes,
+            "offsets": _get_binary_offsets(shapes, BINARY_DTYPE),
+            "ratings": ratings,
+        }
+    ).encode("utf-8")
+    data_offset = len(BINARY_MAGIC) + 4 + len(header)
+    padding = -data_offset % BINARY_ALIGNMENT
+    with open(filepath, "wb") as file:
+        file.write(BINARY_MAGIC + struct.pack("<I", len(header)) + header + b" " * padding)
+        for model_matrices in matrices:
+            for matrix in model_matrices:
+                file.write(numpy.ascontiguousarray(matrix, dtype=BINARY_DTYPE).tobytes())
+
+
+def load_models(filepath: str, amount: Optional[int] = None) -> List[Model]:
+    """Loads the models from the specified filepath, in json or the binary model format.
+    If an amount is specified, only that many models are loaded: the best rated ones of
+    binary model files with ratings, otherwise the first ones in the file.
+    """
+    with open(filepath, "rb") as file:
+        is_binary = file.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+    if is_binary:
+        return _load_binary_models(filepath, amount)
+
     with open(filepath, "r", encoding="utf-8") as file:
-        contents = json.load(file)
-    return [Model.construct_from_list(list_) for list_ in contents]
+        return [
+            Model.construct_from_list(list_)
+            for list_ in itertools.islice(_iterate_json_list(file), amount)
+        ]
+
+
+def _iterate_json_list(file: TextIO, chunk_size: int = JSON_CHUNK_SIZE) -> Iterator[Any]:
+    """Yields the entries of the json list in the file one by one, reading the file only
+    as far as needed
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    expected = "["  # "[", "entry", "entry or ]" or ", or ]"
+    while True:
+        buffer = buffer.lstrip()
+        if not buffer:
+            buffer = file.read(chunk_size)
+            if not buffer:
+                raise ValueError("Unexpected end of json list")
+            continue
+
+        if expected == "[":
+            if buffer[0] != "[":
+                raise ValueError("Expected a json list")
+            buffer, expected = buffer[1:], "entry or ]"
+        elif buffer[0] == "]" and expected in ("entry or ]", ", or ]"):
+            return
+        elif expected == ", or ]":
+            if buffer[0] != ",":
+                raise ValueError("Expected , or ] in json list")
+            buffer, expected = buffer[1:], "entry"
+        else:
+            try:
+                entry, end = decoder.raw_decode(buffer)
+                rest = buffer[end:].lstrip()
+            except json.JSONDecodeError:
+                rest = ""  # the entry is incomplete
+            # an entry is only complete once followed by a separator, e.g. "2." of "2.5" is not
+            if not rest or rest[0] not in ",]":
+                chunk = file.read(max(chunk_size, len(buffer)))
+                if not chunk:
+                    raise ValueError("Unexpected end of json list")
+                buffer += chunk
+                continue
+            yield entry
+            buffer, expected = rest, ", or ]"
+
+
+def _get_binary_offsets(shapes: List[List[Tuple[int, int]]], dtype: str) -> List[int]:
+    # byte offsets of the weights of the models, relative to the start of the weights
+    itemsize = numpy.dtype(dtype).itemsize
+    offsets = []
+    offset = 0
+    for model_shapes in shapes:
+        offsets.append(offset)
+        offset += sum(rows * columns for rows, columns in model_shapes) * itemsize
+    return offsets
+
+
+def _load_binary_models(filepath: str, amount: Optional[int]) -> List[Model]:
+    # the weights are memory mapped copy-on-write: MatrixLayers use them without copying
+    # and only the weights of the loaded models are read from the file, while changes to
+    # the weights never reach the file
+    with open(filepath, "rb") as file:
+        file.seek(len(BINARY_MAGIC))
+        (header_length,) = struct.unpack("<I", file.read(4))
+        header = json.loads(file.read(header_length).decode("utf-8"))
+    if header["version"] not in SUPPORTED_BINARY_VERSIONS:
+        raise ValueError(f"Unsupported binary model format version: {header['version']}")
+    if header["version"] == 1:
+        header["offsets"] = _get_binary_offsets(header["shapes"], header["dtype"])
+        header["ratings"] = None
+
+    indices = list(range(len(header["shapes"])))
+    if amount is not None:
+        if header["ratings"] is not None:
+            ratings = header["ratings"]
+            # best first, models without a rating (None or NaN) last
+            indices.sort(
+                key=lambda index: (
+                    (0, -ratings[index])
+                    if ratings[index] is not None and not math.isnan(ratings[index])
+                    else (1, 0)
+                )
+            )
+        indices = indices[:amount]
+
+    data_offset = len(BINARY_MAGIC) + 4 + header_length
+    data_offset += -data_offset % BINARY_ALIGNMENT
+    size = sum(rows * columns for shapes in header["shapes"] for rows, columns in shapes)
+    if size:
+        weights = numpy.memmap(
+            filepath, dtype=header["dtype"], mode="c", offset=data_offset, shape=(size,)
+        )
+    else:
+        weights = numpy.zeros(0, dtype=header["dtype"])
+
+    models = []
+    for index in indices:
+        matrices = []
+        position = header["offsets"][index] // weights.itemsize
+        for rows, columns in header["shapes"][index]:
+            matrices.append(weights[position : position + rows * columns].reshape(rows, columns))
+            position += rows * columns
+        model = Model(inputs=0, outputs=0)
+        model.deserialize_matrices(matrices)
+        models.append(model)
+    return models
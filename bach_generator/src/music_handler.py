@@ -4,36 +4,112 @@ Created on Wed Sep 15 18:29:08 2021
 
 @author: richa
 """
+from __future__ import annotations
+
+import logging
 from abc import ABC, abstractmethod
-from typing import List
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from bach_generator.src import midi
+from bach_generator.src.cache import ParseCache
+from bach_generator.src.midi import OutputNote, QuarterLength
+
+if TYPE_CHECKING:
+    import music21
 
-import music21
+SIXTEENTH = 0.25
 
 
 def extract_notes_from_part(part: music21.stream.Part) -> List[music21.note.Note]:
     """Extracts all note objects from the specified part"""
+    import music21  # pylint: disable=import-outside-toplevel
+
     return [note for note in part.notes if isinstance(note, music21.note.Note)]
 
 
 class BaseMusicHandler(ABC):
     """Base music handler class. Template: already implements the parse method"""
 
-    def __init__(self):
-        self.part: music21.stream.Part = None
-        self.notes: List[music21.note.Note] = None
+    def __init__(self, cache: Optional[ParseCache] = None, fast_parse: bool = False):
+        self.cache = cache
+        self.fast_parse = fast_parse
+        self._filename: Optional[str] = None
+        self._part: music21.stream.Part = None
+        self._notes: List[music21.note.Note] = None
+        self._rhythm: Optional[List[Tuple[QuarterLength, QuarterLength]]] = None
+
+    @property
+    def part(self) -> music21.stream.Part:
+        """The part parsed from the input file. If the note names were read from the cache,
+        the file is only parsed once the part is needed.
+        """
+        if self._part is None and self._filename is not None:
+            self._parse_part(self._filename)
+        return self._part
+
+    @property
+    def notes(self) -> List[music21.note.Note]:
+        """The note objects of the part parsed from the input file"""
+        if self._notes is None and self._filename is not None:
+            self._parse_part(self._filename)
+        return self._notes
+
+    @property
+    def rhythm(self) -> List[Tuple[QuarterLength, QuarterLength]]:
+        """The offsets and quarter lengths of the notes parsed from the input file"""
+        if self._rhythm is None and self._filename is not None:
+            self._rhythm = [(offset, length) for _, offset, length in self._extract_notes()]
+        return self._rhythm
+
+    def parse(self, filename) -> List[str]:
+        """Parses the specified filename and returns a list of note names.
+        If a cache is set, the note names are read from and written to it. With fast_parse,
+        the note names are read from midi files directly, without music21 where possible.
+        """
+        self._filename = filename
+        self._part, self._notes, self._rhythm = None, None, None
+        key = None
+        if self.cache is not None:
+            key = self.cache.get_key(filename, type(self).__name__)
+            note_names = self.cache.load(key)
+            if note_names is not None:
+                return note_names
+
+        notes = self._extract_notes()
+        self._rhythm = [(offset, length) for _, offset, length in notes]
+        note_names = [name for name, _, _ in notes]
+        if key is not None:
+            self.cache.store(key, note_names)
+        return note_names
+
+    def _extract_notes(self) -> List[Tuple[str, QuarterLength, QuarterLength]]:
+        if self.fast_parse:
+            try:
+                return midi.extract_notes(self._filename)
+            except midi.UnsupportedMidiError as exc:
+                logging.info("Parsing with music21 instead: %s", exc)
+        if self._notes is None:
+            self._parse_part(self._filename)
+        return [(note.nameWithOctave, note.offset, note.quarterLength) for note in self._notes]
+
+    def _parse_part(self, filename) -> None:
+        import music21  # pylint: disable=import-outside-toplevel
 
-    def parse(self, filename) -> List[int]:
-        """Parses the specified filename and returns a list of note names"""
         stream = music21.converter.parse(filename)
         parts = list(music21.instrument.partitionByInstrument(stream))
-        self.part = parts[1] if len(parts) > 1 else parts[0]
-        self.notes = extract_notes_from_part(self.part)
-        return [note.nameWithOctave for note in self.notes]
+        self._part = parts[1] if len(parts) > 1 else parts[0]
+        self._notes = extract_notes_from_part(self._part)
 
     @abstractmethod
     def generate_score(self, note_names: List[str]) -> music21.stream.Score:
         """Generates music21.stream.Score from a list of note names"""
 
+    @abstractmethod
+    def generate_notes(self, note_names: List[str]) -> List[OutputNote]:
+        """Generates (pitch, offset, quarter length) notes from a list of note names,
+        to be written with midi.write_midi instead of generating a score.
+        """
+
 
 class SimpleMusicHandler(BaseMusicHandler):
     """Music handler that writes a stream of notes as 16th to a midi file"""
@@ -42,12 +118,21 @@ class SimpleMusicHandler(BaseMusicHandler):
         """Generates a new music21.stream.Score from a list of note names.
         All notes are 16th notes.
         """
+        import music21  # pylint: disable=import-outside-toplevel
+
         score = music21.stream.Score()
         for note_name in note_names:
             note = music21.note.Note(nameWithOctave=note_name, type="16th")
             score.append(note)
         return score
 
+    def generate_notes(self, note_names: List[str]) -> List[OutputNote]:
+        """Generates consecutive 16th notes, like generate_score"""
+        return [
+            (midi.note_name_to_pitch(note_name), i * SIXTEENTH, SIXTEENTH)
+            for i, note_name in enumerate(note_names)
+        ]
+
 
 class CopyMusicHandler(BaseMusicHandler):
     """Music handler that copies the rhythms from the input midi and applies it
@@ -58,8 +143,19 @@ class CopyMusicHandler(BaseMusicHandler):
         """Returns the score that was read in using the parse method, with all
         notes replaced by the specified note names.
         """
+        import music21  # pylint: disable=import-outside-toplevel
+
         for note, note_name in zip(self.notes, note_names):
             note.nameWithOctave = note_name
         score = music21.stream.Score()
         score.append(self.part)
         return score
+
+    def generate_notes(self, note_names: List[str]) -> List[OutputNote]:
+        """Applies the rhythm of the notes read in using the parse method to the note names.
+        Unlike generate_score, the rest of the input part (e.g. chords) is not copied.
+        """
+        return [
+            (midi.note_name_to_pitch(note_name), offset, quarter_length)
+            for (offset, quarter_length), note_name in zip(self.rhythm, note_names)
+        ]
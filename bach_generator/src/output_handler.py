@@ -4,11 +4,20 @@ Created on Wed Sep 15 18:04:19 2021
 
 @author: richa
 """
+from __future__ import annotations
+
 import datetime
+import logging
 import os
+import queue
 import shutil
+import threading
+from typing import TYPE_CHECKING, Any, Callable, List, Optional
+
+from bach_generator.src import midi
 
-import music21
+if TYPE_CHECKING:
+    import music21
 
 
 class OutputHandler:
@@ -33,3 +42,59 @@ class OutputHandler:
     def write(self, score: music21.stream.Score, filename: str) -> None:
         """Writes the specified score to the output directory under the specified filename"""
         score.write("midi", os.path.join(self.directory, filename))
+
+    def write_notes(self, notes: List[midi.OutputNote], filename: str) -> None:
+        """Writes the specified (pitch, offset, quarter length) notes as a midi file
+        to the output directory under the specified filename, without music21
+        """
+        midi.write_midi(os.path.join(self.directory, filename), notes)
+
+
+class BackgroundWriter:
+    """Runs write jobs in order on a background thread, so that the caller does not wait
+    for disk and music21 work. At most max_pending jobs are queued: submitting more blocks
+    until the thread catches up. Errors of the jobs are raised again by flush.
+    """
+
+    def __init__(self, max_pending: int = 4):
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._error: Optional[BaseException] = None
+
+    def submit(self, function: Callable[..., Any], *args: Any) -> None:
+        """Queues the function to be called with the arguments on the background thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._work, name="output-writer", daemon=True)
+            self._thread.start()
+        self._queue.put((function, args))
+
+    def flush(self) -> None:
+        """Waits until all submitted jobs are done"""
+        if self._thread is not None:
+            self._queue.join()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def close(self) -> None:
+        """Waits for all submitted jobs and stops the background thread"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                function, args = job
+                function(*args)
+            except Exception as exc:  # pylint: disable=broad-except
+                logging.exception("Failed to write output")
+                if self._error is None:
+                    self._error = exc
+            finally:
+                self._queue.task_done()
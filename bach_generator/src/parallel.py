@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""Runs models in parallel on a pool of worker processes that lives for a whole run"""
+
+from __future__ import annotations
+
+import pickle
+from dataclasses import dataclass
+from multiprocessing.pool import Pool
+from multiprocessing.shared_memory import SharedMemory
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy
+
+from bach_generator.src.encoder import Quantizer
+from bach_generator.src.judge import Judge
+from bach_generator.src.manager import CloneOrigin, ModelManager
+from bach_generator.src.model import JumbleStrategy, Model, construct_input_windows
+
+if TYPE_CHECKING:
+    from bach_generator.runner import GeneticAlgorithmRunner
+
+# rating and, if requested, the encoded outputs of a model run in a worker process
+Result = Tuple[float, Optional[List[int]]]
+
+# run state of the current worker process, set up once by the pool initializer
+_worker_state: Dict[str, Any] = {}
+
+
+@dataclass
+class SharedArray:
+    """Describes a numpy array placed in shared memory, which processes can attach to
+    without copying the array.
+    """
+
+    name: str
+    shape: Tuple[int, ...]
+    dtype: str
+
+    @classmethod
+    def create(cls, array: numpy.ndarray) -> Tuple[SharedArray, SharedMemory]:
+        """Copies the array into a new shared memory block. The returned block must be
+        unlinked by the creating process once no longer needed.
+        """
+        memory = SharedMemory(create=True, size=max(1, array.nbytes))
+        shared_array = cls(memory.name, array.shape, array.dtype.str)
+        numpy.ndarray(array.shape, array.dtype, buffer=memory.buf)[...] = array
+        return shared_array, memory
+
+    def attach(self) -> Tuple[numpy.ndarray, SharedMemory]:
+        """Returns a numpy array backed by the shared memory block and the block itself,
+        which must be kept referenced while the array is in use.
+        """
+        memory = SharedMemory(name=self.name)
+        array = numpy.ndarray(self.shape, numpy.dtype(self.dtype), buffer=memory.buf)
+        return array, memory
+
+
+def _init_worker(
+    encoded_inputs: SharedArray,
+    input_windows: Dict[int, SharedArray],
+    quantizer: Quantizer,
+    judge: Judge,
+) -> None:
+    inputs_array, memory = encoded_inputs.attach()
+    _worker_state["shared_memory"] = [memory]
+    _worker_state["encoded_inputs"] = inputs_array
+    _worker_state["input_windows"] = {}
+    for size, shared_windows in input_windows.items():
+        windows, memory = shared_windows.attach()
+        _worker_state["shared_memory"].append(memory)
+        _worker_state["input_windows"][size] = windows
+    _worker_state["quantizer"] = quantizer
+    _worker_state["judge"] = judge
+
+
+def _get_input_windows(size: int) -> numpy.ndarray:
+    input_windows = _worker_state["input_windows"]
+    if size not in input_windows:
+        input_windows[size] = construct_input_windows(
+            _worker_state["encoded_inputs"], size
+        )
+    return input_windows[size]
+
+
+def _get_input_size(model_manager: ModelManager) -> int:
+    # avoids constructing the models of clones just to read their input size
+    if model_manager.origin is not None:
+        return model_manager.origin.model.inputs
+    return model_manager.model.inputs
+
+
+def _rate_weights(task: Tuple[numpy.ndarray, bool]) -> Result:
+    weights, return_outputs = task
+    model_outputs = numpy.dot(_get_input_windows(weights.shape[0]), weights)
+    encoded_outputs = _worker_state["quantizer"].quantize_matrix(model_outputs.reshape(1, -1))
+    (rating,) = _worker_state["judge"].rate_all(encoded_outputs).tolist()
+    return rating, encoded_outputs[0].tolist() if return_outputs else None
+
+
+def _get_parent_models(shared_models: SharedArray) -> List[Model]:
+    # parent models are broadcast once per generation, so only the latest ones are kept
+    if _worker_state.get("parent_models_name") != shared_models.name:
+        array, memory = shared_models.attach()
+        _worker_state["parent_models"] = pickle.loads(array.tobytes())
+        _worker_state["parent_models_name"] = shared_models.name
+        del array
+        memory.close()
+    return _worker_state["parent_models"]
+
+
+def _rate_clone(task: Tuple[SharedArray, int, int, JumbleStrategy, float, bool]) -> Result:
+    shared_models, index, seed, jumble_strategy, weight_divergence, return_outputs = task
+    parent_model = _get_parent_models(shared_models)[index]
+    origin = CloneOrigin(parent_model, seed, jumble_strategy, weight_divergence)
+    model = origin.construct_model()
+    if model.effective_weights is not None:
+        return _rate_weights((model.effective_weights, return_outputs))
+
+    model_manager = _run_model(ModelManager.construct_with_model(model))
+    encoded_outputs = model_manager.encoded_outputs if return_outputs else None
+    return model_manager.rating, encoded_outputs
+
+
+def _run_model(model_manager: ModelManager) -> ModelManager:
+    encoded_inputs = _worker_state["encoded_inputs"]
+    windows = _get_input_windows(model_manager.model.inputs)
+    model_manager.run_model(encoded_inputs, _worker_state["quantizer"], windows)
+    model_manager.get_rated_by(_worker_state["judge"], encoded_inputs)
+    return model_manager
+
+
+class WorkerPool:
+    """Run function that runs models in parallel on a pool of worker processes.
+    The pool is started on first use and reused until closed, so that workers are only
+    spawned and sent the run state (quantizer and judge) once per run. The encoded inputs
+    and input windows are placed in shared memory, which all workers attach to.
+
+    Workers only receive the effective weights of each model and only send back its rating,
+    plus its encoded outputs if return_outputs is set. Models without effective weights are
+    sent to the workers as a whole. Clones from ModelManager.clone_with_seed are not
+    constructed in the parent process: their parent models are placed in shared memory once
+    per call and workers reconstruct the clones from their seeds.
+    """
+
+    def __init__(
+        self,
+        processes: Optional[int] = None,
+        chunksize: int = 20,
+        return_outputs: bool = False,
+    ):
+        self.processes = processes
+        self.chunksize = chunksize
+        self.return_outputs = return_outputs
+        self._pool: Optional[Pool] = None
+        # the runner and inputs the workers were set up for, held so that they are not reused
+        self._run_key: Optional[Tuple[GeneticAlgorithmRunner, List[int]]] = None
+        self._shared_memory: List[SharedMemory] = []
+
+    def __call__(
+        self, runner: GeneticAlgorithmRunner, model_managers: List[ModelManager]
+    ) -> List[ModelManager]:
+        """Runs the models in parallel using the specified runner"""
+        if not model_managers:
+            return []
+        pool = self._start(runner, {_get_input_size(manager) for manager in model_managers})
+
+        clones: List[int] = []
+        compiled: List[int] = []
+        others: List[int] = []
+        for i, manager in enumerate(model_managers):
+            if manager.origin is not None:
+                clones.append(i)
+            elif manager.model.effective_weights is not None:
+                compiled.append(i)
+            else:
+                others.append(i)
+
+        origins = [model_managers[i].origin for i in clones]
+        results = self._rate_clones(pool, origins)  # type: ignore
+        tasks = [
+            (model_managers[i].model.effective_weights, self.return_outputs)
+            for i in compiled
+        ]
+        results += pool.map(_rate_weights, tasks, chunksize=self.chunksize)
+        for i, result in zip(clones + compiled, results):
+            model_managers[i].set_result(*result)
+
+        run_managers = pool.map(
+            _run_model, [model_managers[i] for i in others], chunksize=self.chunksize
+        )
+        for i, manager in zip(others, run_managers):
+            model_managers[i] = manager
+        return model_managers
+
+    def _rate_clones(self, pool: Pool, origins: List[CloneOrigin]) -> List[Result]:
+        if not origins:
+            return []
+
+        parent_models = list({id(origin.model): origin.model for origin in origins}.values())
+        parent_indices = {id(model): i for i, model in enumerate(parent_models)}
+        data = numpy.frombuffer(pickle.dumps(parent_models), dtype=numpy.uint8)
+        shared_models, memory = SharedArray.create(data)
+        try:
+            tasks = [
+                (
+                    shared_models,
+                    parent_indices[id(origin.model)],
+                    origin.seed,
+                    origin.jumble_strategy,
+                    origin.weight_divergence,
+                    self.return_outputs,
+                )
+                for origin in origins
+            ]
+            return pool.map(_rate_clone, tasks, chunksize=self.chunksize)
+        finally:
+            memory.close()
+            memory.unlink()
+
+    def __enter__(self) -> WorkerPool:
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def _start(self, runner: GeneticAlgorithmRunner, sizes: Iterable[int]) -> Pool:
+        # restart the workers if they were set up for another runner or input file
+        if (
+            self._pool is not None
+            and self._run_key is not None
+            and self._run_key[0] is runner
+            and self._run_key[1] is runner.encoded_inputs
+        ):
+            return self._pool
+
+        self.close()
+        encoded_inputs = self._share(numpy.array(runner.encoded_inputs, dtype=numpy.int64))
+        input_windows = {
+            size: self._share(runner.get_input_windows(size)) for size in sizes
+        }
+        self._pool = Pool(
+            processes=self.processes,
+            initializer=_init_worker,
+            initargs=(encoded_inputs, input_windows, runner.quantizer, runner.judge),
+        )
+        self._run_key = (runner, runner.encoded_inputs)
+        return self._pool
+
+    def _share(self, array: numpy.ndarray) -> SharedArray:
+        shared_array, memory = SharedArray.create(array)
+        self._shared_memory.append(memory)
+        return shared_array
+
+    def close(self, terminate: bool = False) -> None:
+        """Shuts down the worker processes, if started, and releases the shared memory.
+        The workers are terminated right away if terminate is set, e.g. after an interrupted
+        run, instead of waiting for their outstanding work to finish
+        """
+        if self._pool is not None:
+            if terminate:
+                self._pool.terminate()
+            else:
+                self._pool.close()
+            self._pool.join()
+            self._pool = None
+            self._run_key = None
+
+        for memory in self._shared_memory:
+            memory.close()
+            memory.unlink()
+        self._shared_memory = []
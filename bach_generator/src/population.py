@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Evaluates a whole population of models at once by stacking the effective
+weight matrices of same-shaped models.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy
+
+from bach_generator.src.manager import ModelManager
+from bach_generator.src.model import Model, fit_columns
+
+# upper bound for the amount of output floats computed at once
+MAX_BATCH_ELEMENTS = 2**22
+
+Shape = Tuple[int, ...]
+
+
+def get_shape(model: Model) -> Optional[Shape]:
+    """Returns the shape of the effective weight matrix of the model.
+    Returns None if the model has no effective weights.
+    """
+    weights = model.effective_weights
+    if weights is None:
+        return None
+    return weights.shape
+
+
+def group_by_shape(
+    model_managers: List[ModelManager],
+) -> Dict[Optional[Shape], List[ModelManager]]:
+    """Groups the model managers by the shape of their models.
+    Managers whose models cannot be stacked are grouped under None.
+    """
+    groups: Dict[Optional[Shape], List[ModelManager]] = {}
+    for model_manager in model_managers:
+        groups.setdefault(get_shape(model_manager.model), []).append(model_manager)
+    return groups
+
+
+def compute_population(models: List[Model], windows: numpy.ndarray) -> numpy.ndarray:
+    """Computes the outputs of all models for the specified matrix of input windows.
+    All models must share the same shape. Returns a matrix of shape (models x outputs),
+    holding the flattened outputs of each model in one row.
+    """
+    if not models:
+        return numpy.zeros(shape=(0, 0))
+
+    height, width = get_shape(models[0])  # type: ignore
+    windows = fit_columns(windows, height)
+    block_size = max(1, MAX_BATCH_ELEMENTS // max(1, len(windows) * width))
+    blocks = [
+        _compute_block(models[i : i + block_size], windows)
+        for i in range(0, len(models), block_size)
+    ]
+    return numpy.concatenate(blocks, axis=0)
+
+
+def _compute_block(models: List[Model], windows: numpy.ndarray) -> numpy.ndarray:
+    # side by side, the effective weights of all models form a single matrix
+    weights = numpy.concatenate([model.effective_weights for model in models], axis=1)
+    outputs = numpy.dot(windows, weights).reshape(len(windows), len(models), -1)
+    return outputs.transpose(1, 0, 2).reshape(len(models), -1)
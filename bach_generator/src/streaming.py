@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""Rates models chunk by chunk of the inputs, only keeping running statistics of their
+outputs, so that the memory needed does not grow with the length of the inputs.
+"""
+
+from typing import List
+
+import numpy
+
+from bach_generator.src.encoder import Quantizer, get_first_appearances
+from bach_generator.src.judge import Judge
+from bach_generator.src.model import Model, iterate_input_windows
+
+DEFAULT_CHUNK_SIZE = 4096
+
+
+def compute_in_chunks(
+    model: Model, encoded_inputs: List[int], chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> numpy.ndarray:
+    """Computes the outputs of the model like Model.compute_windows does for the full
+    matrix of input windows, without constructing it
+    """
+    outputs = [
+        model.compute_windows(windows)
+        for windows in iterate_input_windows(encoded_inputs, model.inputs, chunk_size)
+    ]
+    if not outputs:
+        return numpy.zeros(shape=(0, model.outputs))
+    return numpy.concatenate(outputs)
+
+
+def rate_in_chunks(
+    model: Model,
+    encoded_inputs: List[int],
+    quantizer: Quantizer,
+    judge: Judge,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> float:
+    """Rates the model like running, quantizing and judging its outputs would, without
+    holding all outputs at once. The outputs are computed twice: once to find their value
+    range and once to collect the histogram of quantized values, including the first
+    appearance of each value and the sum of the inputs at its positions.
+    """
+    if len(encoded_inputs) < 2:
+        raise ValueError("The inputs and outputs must have a length of at least 2")
+    if model.outputs != 1:
+        raise ValueError("The inputs and outputs must have the same length")
+
+    minimum, maximum = numpy.inf, -numpy.inf
+    for windows in iterate_input_windows(encoded_inputs, model.inputs, chunk_size):
+        outputs = model.compute_windows(windows)
+        minimum = min(minimum, outputs.min())
+        maximum = max(maximum, outputs.max())
+
+    bins = quantizer.encodings + 1
+    counts = numpy.zeros(bins, dtype=int)
+    first_appearances = numpy.full(bins, len(encoded_inputs))
+    input_sums = numpy.zeros(bins)
+    position = 0
+    for windows in iterate_input_windows(encoded_inputs, model.inputs, chunk_size):
+        outputs = model.compute_windows(windows).ravel()
+        mapped_outputs = quantizer.map_outputs(outputs, minimum, maximum)
+        positions = numpy.arange(position, position + len(outputs))
+        inputs = numpy.asarray(encoded_inputs[position : position + len(outputs)])
+
+        counts += numpy.bincount(mapped_outputs, minlength=bins)
+        input_sums += numpy.bincount(mapped_outputs, weights=inputs, minlength=bins)
+        chunk_first_appearances = get_first_appearances(
+            mapped_outputs, positions, bins, len(encoded_inputs)
+        )
+        numpy.minimum(first_appearances, chunk_first_appearances, out=first_appearances)
+        position += len(outputs)
+
+    notes = quantizer.match_frequencies(counts[None, :], first_appearances[None, :])[0]
+    return judge.rate_histogram(notes, counts, input_sums)
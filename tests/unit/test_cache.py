@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Tests for the cache module"""
+
+import os
+
+import pytest
+from bach_generator.src import cache
+
+
+@pytest.mark.usefixtures("midi_file")
+def test_parse_cache_key(midi_file, tmp_path):
+    cache_ = cache.ParseCache(directory=str(tmp_path))
+    key = cache_.get_key(midi_file.path, "CopyMusicHandler")
+    assert key == cache_.get_key(midi_file.path, "CopyMusicHandler")
+    assert key != cache_.get_key(midi_file.path, "SimpleMusicHandler")
+
+    copied_file = tmp_path / "copy.mid"
+    with open(midi_file.path, "rb") as file:
+        content = file.read()
+    copied_file.write_bytes(content)
+    assert key == cache_.get_key(str(copied_file), "CopyMusicHandler")
+    copied_file.write_bytes(content + b"\0")
+    assert key != cache_.get_key(str(copied_file), "CopyMusicHandler")
+
+
+@pytest.mark.parametrize("note_names", [[], ["C4", "D#5", "C4"]])
+def test_parse_cache_store_load(note_names, tmp_path):
+    cache_ = cache.ParseCache(directory=str(tmp_path / "cache"))
+    assert cache_.load("abc") is None
+    cache_.store("abc", note_names)
+    assert cache_.load("abc") == note_names
+    assert os.listdir(cache_.directory) == ["abc.json"]
+
+
+def test_parse_cache_load_corrupt_file(tmp_path):
+    cache_ = cache.ParseCache(directory=str(tmp_path))
+    (tmp_path / "abc.json").write_text("{not json")
+    assert cache_.load("abc") is None
+
+
+def test_parse_cache_evicts_least_recently_used(tmp_path):
+    cache_ = cache.ParseCache(directory=str(tmp_path), max_entries=2)
+    for time_, key in enumerate(["a", "b"]):
+        cache_.store(key, [key])
+        os.utime(tmp_path / f"{key}.json", (time_, time_))
+    assert cache_.load("a") == ["a"]  # now more recently used than b
+
+    cache_.store("c", ["c"])
+    assert sorted(os.listdir(tmp_path)) == ["a.json", "c.json"]
+
+
+def test_default_directory(monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", os.path.join("some", "dir"))
+    assert cache.get_default_directory() == os.path.join("some", "dir", "bach_generator")
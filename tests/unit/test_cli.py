@@ -33,6 +33,29 @@ def test_generations(input_args, expected):
     assert args.generations == expected
 
 
+@pytest.mark.parametrize(
+    "input_args, expected",
+    [
+        ("a", False),
+        ("a --batched", True),
+        ("a -b", True),
+    ],
+)
+def test_batched(input_args, expected):
+    parser = cli.construct_parser()
+    args = parser.parse_args(input_args.split())
+    assert args.batched == expected
+
+
+@pytest.mark.parametrize(
+    "input_args, expected", [("a", None), ("a --chunk-size 100", 100)]
+)
+def test_chunk_size(input_args, expected):
+    parser = cli.construct_parser()
+    args = parser.parse_args(input_args.split())
+    assert args.chunk_size == expected
+
+
 @pytest.mark.parametrize(
     "input_args, expected",
     [
@@ -46,6 +69,19 @@ def test_save(input_args, expected):
     assert args.save == expected
 
 
+@pytest.mark.parametrize(
+    "input_args, expected",
+    [
+        ("a", "json"),
+        ("a --save-format binary", "binary"),
+    ],
+)
+def test_save_format(input_args, expected):
+    parser = cli.construct_parser()
+    args = parser.parse_args(input_args.split())
+    assert args.save_format == expected
+
+
 @pytest.mark.parametrize(
     "input_args, expected",
     [
@@ -176,6 +212,38 @@ def test_weight_jumble_strategy_fail(input_args):
         parser.parse_args(input_args.split())
 
 
+@pytest.mark.parametrize("input_args, expected", [("a", False), ("a --direct-midi", True)])
+def test_direct_midi(input_args, expected):
+    parser = cli.construct_parser()
+    args = parser.parse_args(input_args.split())
+    assert args.direct_midi == expected
+
+
+@pytest.mark.parametrize("input_args, expected", [("a", False), ("a --fast-parse", True)])
+def test_fast_parse(input_args, expected):
+    parser = cli.construct_parser()
+    args = parser.parse_args(input_args.split())
+    assert args.fast_parse == expected
+
+
+@pytest.mark.parametrize(
+    "input_args, expected", [("a", False), ("a --no-parse-cache", True)]
+)
+def test_no_parse_cache(input_args, expected):
+    parser = cli.construct_parser()
+    args = parser.parse_args(input_args.split())
+    assert args.no_parse_cache == expected
+
+
+@pytest.mark.parametrize(
+    "input_args, expected", [("a", False), ("a --seeded-clones", True)]
+)
+def test_seeded_clones(input_args, expected):
+    parser = cli.construct_parser()
+    args = parser.parse_args(input_args.split())
+    assert args.seeded_clones == expected
+
+
 @pytest.mark.parametrize(
     "input_args, expected",
     [
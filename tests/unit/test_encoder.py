@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 """Tests for the encoder module"""
 
+import collections
 import random
 import string
 
+import numpy
 import pytest
 from bach_generator.src import encoder
 
@@ -120,3 +122,107 @@ def test_quantizer_quantize(
     quantizer_.setup(encoded_notes)
     quantized_outputs = quantizer_.quantize(outputs=unquantized_inputs)
     assert quantized_outputs == expected_quantized_outputs
+
+
+@pytest.mark.parametrize(
+    "encoded_notes, unquantized_inputs, expected_quantized_outputs",
+    [
+        ([0], [], []),
+        ([0], [0.54, 0.54], [0, 0]),
+        ([0, 1, 1], [0.23, 0.53], [1, 0]),
+        ([4, 4, 2], [0.0, 1.0, 0.5, 0.5, 1.0], [0, 4, 2, 2, 4]),
+        (
+            [0, 1, 5, 3, 7, 2, 2, 3, 1],
+            [0.0, 0.15, 0.75, 0.232, 0.754, 0.96, 0.43, 0.264],
+            [2, 1, 3, 1, 3, 0, 5, 7],
+        ),
+    ],
+)
+def test_quantizer_quantize_array(
+    encoded_notes, unquantized_inputs, expected_quantized_outputs
+):
+    quantizer_ = encoder.Quantizer()
+    quantizer_.setup(encoded_notes)
+    quantized_outputs = quantizer_.quantize_array(numpy.array(unquantized_inputs))
+    assert quantized_outputs.dtype.kind == "i"
+    assert quantized_outputs.tolist() == expected_quantized_outputs
+
+
+def _quantize_with_counter(sorted_encoded_notes, outputs):
+    # reference implementation of the frequency rank mapping
+    min_ = min(outputs)
+    grounded_outputs = [output - min_ for output in outputs]
+    scaling = max(grounded_outputs) / len(sorted_encoded_notes)
+    mapped_outputs = [
+        round(output / scaling) if scaling != 0 else 0 for output in grounded_outputs
+    ]
+    sorted_outputs = [
+        output for output, _ in collections.Counter(mapped_outputs).most_common()
+    ]
+    output_mapping = {
+        output: sorted_encoded_notes[i] if i < len(sorted_encoded_notes) else 0
+        for i, output in enumerate(sorted_outputs)
+    }
+    return [output_mapping[output] for output in mapped_outputs]
+
+
+@pytest.mark.parametrize("size", [1, 7, 100])
+def test_quantizer_quantize_same_as_counter(size):
+    quantizer_ = encoder.Quantizer()
+    quantizer_.setup(random.choices(list(range(12)), k=50))
+    for _ in range(20):
+        outputs = [float(random.randint(-5, 5)) for _ in range(size)]
+        assert quantizer_.quantize(outputs) == _quantize_with_counter(
+            quantizer_._sorted_encoded_notes, outputs
+        )
+        outputs = [random.gauss(0, 1) for _ in range(size)]
+        assert quantizer_.quantize(outputs) == _quantize_with_counter(
+            quantizer_._sorted_encoded_notes, outputs
+        )
+
+
+@pytest.mark.parametrize(
+    "encoded_notes, unquantized_inputs, expected_quantized_outputs",
+    [
+        ([0], [[], []], [[], []]),
+        ([], [[0.5]], [[]]),
+        ([0, 1, 1], [[0.23, 0.53], [0.53, 0.23], [0.1, 0.1]], [[1, 0], [1, 0], [1, 1]]),
+        ([4, 4, 2], [[0.0, 1.0, 0.5, 0.5, 1.0]], [[0, 4, 2, 2, 4]]),
+    ],
+)
+def test_quantizer_quantize_matrix(
+    encoded_notes, unquantized_inputs, expected_quantized_outputs
+):
+    quantizer_ = encoder.Quantizer()
+    quantizer_.setup(encoded_notes)
+    quantized_outputs = quantizer_.quantize_matrix(numpy.array(unquantized_inputs))
+    assert quantized_outputs.tolist() == expected_quantized_outputs
+
+
+@pytest.mark.parametrize("block_elements", [1, 10, 2**16])
+def test_quantizer_quantize_matrix_same_as_rows(block_elements, monkeypatch):
+    monkeypatch.setattr(encoder, "QUANTIZE_BLOCK_ELEMENTS", block_elements)
+    quantizer_ = encoder.Quantizer()
+    quantizer_.setup(random.choices(list(range(12)), k=50))
+    outputs = numpy.random.randn(9, 20)
+    outputs[3] = 0.5
+    outputs[5] = numpy.random.randint(-3, 3, size=20)
+    quantized_outputs = quantizer_.quantize_matrix(outputs)
+    assert quantized_outputs.tolist() == [
+        quantizer_.quantize(row.tolist()) for row in outputs
+    ]
+
+
+@pytest.mark.parametrize(
+    "values, positions, bins, expected",
+    [
+        ([], [], 3, [9, 9, 9]),
+        ([1, 0, 1, 1], [0, 1, 2, 3], 3, [1, 0, 9]),
+        ([2, 2, 0, 2], [5, 3, 7, 4], 4, [7, 9, 3, 9]),
+    ],
+)
+def test_get_first_appearances(values, positions, bins, expected):
+    first_appearances = encoder.get_first_appearances(
+        numpy.array(values, dtype=int), numpy.array(positions, dtype=int), bins, default=9
+    )
+    assert first_appearances.tolist() == expected
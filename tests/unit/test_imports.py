@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""Tests that heavy dependencies are only imported once they are needed"""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+HEAVY_MODULES = ["music21", "scipy", "matplotlib", "tkinter"]
+
+
+def imported_heavy_modules(code: str):
+    """Runs the code in a new interpreter and returns the heavy modules it imported"""
+    code += f"\nimport sys\nprint(json.dumps([m for m in {HEAVY_MODULES} if m in sys.modules]))"
+    result = subprocess.run(
+        [sys.executable, "-c", "import json\n" + code],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "import bach_generator.__main__",
+        "from bach_generator import cli\ncli.construct_parser().parse_args(['a'])",
+        "from bach_generator import runner\nrunner.GeneticAlgorithmRunner()",
+    ],
+)
+def test_no_heavy_imports(code):
+    assert imported_heavy_modules(code) == []
+
+
+def test_help():
+    result = subprocess.run(
+        [sys.executable, "-m", "bach_generator", "-h"], capture_output=True, check=False
+    )
+    assert result.returncode == 0
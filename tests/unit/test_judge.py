@@ -2,7 +2,9 @@
 """Tests for the judge module"""
 
 import math
+import warnings
 
+import numpy
 import pytest
 from bach_generator.src import judge
 
@@ -30,3 +32,63 @@ def test_judge_fail_insufficient_data(inputs, outputs):
     judge_ = judge.Judge()
     with pytest.raises(ValueError):
         judge_.rate(encoded_inputs=inputs, encoded_outputs=outputs)
+
+
+@pytest.mark.parametrize(
+    "inputs, outputs",
+    [
+        ([1, 0], [[1, 0], [0, 1]]),
+        ([0, 1, 2, 3, 4, 5], [[0, 1, 3, 5, 7, 9], [2, 2, 2, 2, 2, 2], [5, 1, 0, 0, 1, 5]]),
+        ([3, 3, 3], [[0, 1, 2]]),
+        ([0, 4, 1, 4, 2, 8, 1], numpy.random.randint(0, 5, size=(10, 7)).tolist()),
+    ],
+)
+def test_judge_rate_all(inputs, outputs):
+    judge_ = judge.Judge()
+    judge_.setup(inputs)
+    ratings = judge_.rate_all(numpy.array(outputs))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        expected_ratings = [judge_.rate(inputs, row) for row in outputs]
+    assert ratings.tolist() == pytest.approx(expected_ratings, nan_ok=True)
+
+
+@pytest.mark.parametrize(
+    "inputs, outputs",
+    [([], [[]]), ([1], [[1]]), ([1, 2], [[1, 2, 3]])],
+)
+def test_judge_rate_all_fail_insufficient_data(inputs, outputs):
+    judge_ = judge.Judge()
+    judge_.setup(inputs)
+    with pytest.raises(ValueError):
+        judge_.rate_all(numpy.array(outputs))
+
+
+@pytest.mark.parametrize(
+    "inputs, outputs",
+    [
+        ([1, 0], [1, 0]),
+        ([0, 1, 2, 3, 4, 5], [0, 1, 3, 5, 7, 9]),
+        ([0, 1, 2, 3, 4, 5], [2, 2, 2, 2, 2, 2]),
+        ([3, 3, 3], [0, 1, 2]),
+        ([0, 4, 1, 4, 2, 8, 1], [3, 0, 3, 1, 0, 0, 3]),
+    ],
+)
+def test_judge_rate_histogram(inputs, outputs):
+    judge_ = judge.Judge()
+    judge_.setup(inputs)
+    bins = max(outputs) + 1
+    counts = numpy.bincount(outputs, minlength=bins)
+    input_sums = numpy.bincount(outputs, weights=inputs, minlength=bins)
+    rating = judge_.rate_histogram(numpy.arange(bins), counts, input_sums)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        expected_rating = judge_.rate(inputs, outputs)
+    assert rating == pytest.approx(expected_rating, nan_ok=True)
+
+
+def test_judge_rate_histogram_fail_mismatching_length():
+    judge_ = judge.Judge()
+    judge_.setup([1, 2, 3])
+    with pytest.raises(ValueError):
+        judge_.rate_histogram(numpy.arange(2), numpy.array([1, 1]), numpy.array([1, 2]))
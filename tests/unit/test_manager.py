@@ -4,6 +4,7 @@
 import random
 from typing import List
 
+import numpy
 import pytest
 from bach_generator.src import manager, model
 
@@ -40,6 +41,10 @@ class MockQuantizer:
     def quantize(inputs: List[float]) -> List[int]:
         return list(map(int, inputs))
 
+    @staticmethod
+    def quantize_array(inputs: numpy.ndarray) -> numpy.ndarray:
+        return inputs.astype(int)
+
 
 @pytest.mark.parametrize(
     "inputs, outputs, layers, layer_size",
@@ -119,3 +124,54 @@ def test_model_manager_rating(inputs, outputs, expected_rating):
     manager_.encoded_outputs = outputs
     manager_.get_rated_by(judge=MockJudge(), encoded_inputs=inputs)
     assert manager_.rating == expected_rating
+
+
+@pytest.mark.parametrize("inputs", [[], [0], [0, 1, 5, 3, 2, 2]])
+def test_model_manager_run_with_windows(inputs):
+    manager_ = manager.ModelManager(inputs=3, outputs=1, layers=1, layer_size=4)
+    manager_.run_model(inputs=inputs, quantizer=MockQuantizer())
+    expected_encoded_outputs = manager_.encoded_outputs
+
+    windows = model.construct_input_windows(inputs, size=3)
+    manager_.run_model(inputs=inputs, quantizer=MockQuantizer(), input_windows=windows)
+    assert manager_.encoded_outputs == expected_encoded_outputs
+
+
+def test_model_manager_rated():
+    manager_ = manager.ModelManager(inputs=1, outputs=1, layers=1, layer_size=1)
+    assert not manager_.rated
+    manager_.encoded_outputs = [1, 2]
+    manager_.get_rated_by(judge=MockJudge(), encoded_inputs=[1, 2])
+    assert manager_.rated
+
+    clone = manager_.clone(model.jumble_by_factor_strategy, weight_divergence=0.1)
+    assert manager_.rated
+    assert not clone.rated
+
+
+@pytest.mark.parametrize(
+    "encoded_outputs, expected_encoded_outputs", [(None, []), ([1, 0], [1, 0])]
+)
+def test_model_manager_set_result(encoded_outputs, expected_encoded_outputs):
+    manager_ = manager.ModelManager(inputs=1, outputs=1, layers=1, layer_size=1)
+    manager_.encoded_outputs = [2, 2]
+    manager_.set_result(rating=0.5, encoded_outputs=encoded_outputs)
+    assert manager_.rated
+    assert manager_.rating == 0.5
+    assert manager_.encoded_outputs == expected_encoded_outputs
+
+
+def test_model_manager_clone_with_seed():
+    manager_ = manager.ModelManager(inputs=3, outputs=1, layers=1, layer_size=3)
+    manager_.rating = 0.5
+    clone = manager_.clone_with_seed(model.jumble_by_factor_strategy, 0.5, seed=1)
+    assert clone.origin is not None
+    assert clone.rating == 0.5
+    assert not clone.rated
+
+    expected_model = model.jumble_with_seed(
+        manager_.model, model.jumble_by_factor_strategy, 0.5, seed=1
+    )
+    assert clone.model.serialize() == expected_model.serialize()
+    assert clone.origin is None
+    assert clone.model is clone.model
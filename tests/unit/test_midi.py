@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""Tests for the midi module"""
+
+import struct
+from fractions import Fraction
+from typing import List, Tuple
+
+import music21
+import pytest
+from bach_generator.src import midi, music_handler
+
+TICKS_PER_QUARTER = 480
+
+
+def variable_length(value: int) -> bytes:
+    data = bytes([value & 0x7F])
+    while value > 0x7F:
+        value >>= 7
+        data = bytes([value & 0x7F | 0x80]) + data
+    return data
+
+
+def write_midi_file(path, tracks: List[List[Tuple[int, int, int]]]) -> str:
+    """Writes (start, end, pitch) notes as a format 1 midi file, one track per list"""
+    chunks = [b"MThd" + struct.pack(">IHHH", 6, 1, len(tracks), TICKS_PER_QUARTER)]
+    for notes in tracks:
+        events = [(start, 0x90, pitch, 90) for start, _, pitch in notes]
+        events += [(end, 0x80, pitch, 0) for _, end, pitch in notes]
+        data, tick = b"", 0
+        for time, status, pitch, velocity in sorted(events):
+            data += variable_length(time - tick) + bytes([status, pitch, velocity])
+            tick = time
+        data += b"\x00\xff\x2f\x00"
+        chunks.append(b"MTrk" + struct.pack(">I", len(data)) + data)
+    path.write_bytes(b"".join(chunks))
+    return str(path)
+
+
+@pytest.mark.usefixtures("midi_file")
+def test_extract_note_names(midi_file):
+    assert midi.extract_note_names(midi_file.path) == midi_file.notes
+
+
+@pytest.mark.parametrize(
+    "notes",
+    [
+        [(0, 120, 60), (120, 240, 61), (240, 360, 63), (360, 480, 70)],
+        [(0, 120, 60), (0, 120, 64), (120, 240, 67)],
+        [(0, 110, 60), (130, 235, 62), (250, 470, 64)],
+        [(1680, 2160, 60), (2160, 2400, 62), (2400, 4320, 64)],
+    ],
+)
+def test_extract_note_names_like_music21(notes, tmp_path):
+    path = write_midi_file(tmp_path / "test.mid", [notes])
+    assert midi.extract_note_names(path) == music_handler.SimpleMusicHandler().parse(path)
+
+
+def test_extract_note_names_multiple_tracks(tmp_path):
+    path = write_midi_file(tmp_path / "test.mid", [[(0, 480, 60)], [(0, 480, 64)]])
+    with pytest.raises(midi.UnsupportedMidiError):
+        midi.extract_note_names(path)
+
+
+def test_extract_note_names_not_midi(tmp_path):
+    path = tmp_path / "test.mid"
+    path.write_bytes(b"not a midi file")
+    with pytest.raises(midi.UnsupportedMidiError):
+        midi.extract_note_names(str(path))
+
+
+def test_fast_parse_fallback(tmp_path, monkeypatch):
+    path = write_midi_file(tmp_path / "test.mid", [[(0, 480, 60), (480, 960, 64)]])
+    expected = music_handler.SimpleMusicHandler().parse(path)
+    assert midi.extract_note_names(path) == expected  # supported by the fast reader
+    calls = []
+
+    def extract_notes(filename):
+        calls.append(filename)
+        raise midi.UnsupportedMidiError("unsupported")
+
+    monkeypatch.setattr(midi, "extract_notes", extract_notes)
+    assert music_handler.SimpleMusicHandler(fast_parse=True).parse(path) == expected
+    assert calls == [path]
+
+
+@pytest.mark.parametrize(
+    "name, pitch",
+    [
+        ("C4", 60),
+        ("C#4", 61),
+        ("E-4", 63),
+        ("B#3", 60),
+        ("C-5", 71),
+        ("C--5", 70),
+        ("A0", 21),
+        ("C-1", 0),
+        ("C#-1", 1),
+        ("B--1", 10),
+        ("B#-2", 0),
+        ("C-0", 11),
+    ],
+)
+def test_note_name_to_pitch(name, pitch):
+    assert midi.note_name_to_pitch(name) == pitch
+
+
+def test_note_name_to_pitch_like_music21():
+    # music21 also names 4 and 11 E-1 and B-1, which are read with octave -1
+    for pitch in set(range(128)) - {27, 34}:
+        name = music21.pitch.Pitch(midi=pitch).nameWithOctave
+        assert midi.note_name_to_pitch(name) == pitch
+
+
+@pytest.mark.parametrize("name", ["", "H4", "C", "C+4", "4C", "C---1"])
+def test_note_name_to_pitch_fail(name):
+    with pytest.raises(ValueError):
+        midi.note_name_to_pitch(name)
+
+
+@pytest.mark.parametrize(
+    "notes",
+    [
+        [],
+        [(60, 0.0, 0.25), (62, 0.25, 0.25), (64, 0.5, 1.5)],
+        [(60, 0.0, 1.0), (60, 1.0, 1.0), (67, 4.5, Fraction(1, 3))],
+    ],
+)
+def test_write_midi(notes, tmp_path):
+    path = str(tmp_path / "test.mid")
+    midi.write_midi(path, notes)
+    score = music21.converter.parse(path)
+    parsed_notes = [
+        (note.pitch.midi, note.offset, note.quarterLength) for note in score.flatten().notes
+    ]
+    assert parsed_notes == notes
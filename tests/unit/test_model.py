@@ -1,15 +1,20 @@
 # -*- coding: utf-8 -*-
 """Tests for the model module"""
 
+import collections
 import copy
+import io
 import itertools
+import json
 import math
 import os
 import random
 import statistics
+import struct
 from collections import namedtuple
 from itertools import zip_longest
 
+import numpy
 import pytest
 from bach_generator.src import model
 
@@ -532,3 +537,271 @@ def test_load_save_model():
     assert os.path.isfile(TEST_JSON_FILENAME)
     deserialized_models = model.load_models(filepath=TEST_JSON_FILENAME)
     assert deserialized_models == [model_]
+
+
+@pytest.mark.parametrize("layer_class", [model.Layer, model.MatrixLayer])
+def test_load_save_model_binary(layer_class, monkeypatch, tmp_path):
+    monkeypatch.setattr(model.Model, "layer_class", layer_class)
+    models = []
+    for inputs, layers in [(3, [4, 2]), (1, []), (5, [5])]:
+        model_ = model.Model(inputs=inputs, outputs=1)
+        for length in layers:
+            model_.add_layer(length=length)
+        model_.build()
+        models.append(model_)
+    filepath = str(tmp_path / "models.bin")
+    model.save_models_binary(models=models, filepath=filepath)
+
+    deserialized_models = model.load_models(filepath=filepath)
+    assert deserialized_models == models
+    for model_, deserialized_model in zip(models, deserialized_models):
+        assert deserialized_model.serialize() == model_.serialize()
+        windows = model.construct_input_windows([1, 2, 3, 4], model_.inputs)
+        assert numpy.allclose(
+            deserialized_model.compute_windows(windows), model_.compute_windows(windows)
+        )
+
+
+def test_load_best_models_binary(tmp_path):
+    models = [model.Model(inputs=inputs, outputs=1) for inputs in range(1, 6)]
+    for model_ in models:
+        model_.build()
+    filepath = str(tmp_path / "models.bin")
+    model.save_models_binary(models, filepath, ratings=[0.1, 0.5, 0.3, 0.9, 0.2])
+
+    assert model.load_models(filepath) == models
+    assert model.load_models(filepath, amount=2) == [models[3], models[1]]
+    model.save_models_binary(models, filepath)  # without ratings, the first models are best
+    assert model.load_models(filepath, amount=2) == models[:2]
+
+
+def test_load_best_models_binary_unrated_last(tmp_path):
+    models = [model.Model(inputs=inputs, outputs=1) for inputs in range(1, 6)]
+    for model_ in models:
+        model_.build()
+    filepath = str(tmp_path / "models.bin")
+    model.save_models_binary(models, filepath, ratings=[None, float("nan"), 0.3, None, 0.2])
+    assert model.load_models(filepath, amount=4) == [models[2], models[4], models[0], models[1]]
+
+
+def test_load_binary_models_version_1(tmp_path):
+    models = [model.Model(inputs=inputs, outputs=1) for inputs in range(1, 4)]
+    for model_ in models:
+        model_.build()
+    matrices = [model_.serialize_matrices() for model_ in models]
+    header = json.dumps(
+        {
+            "version": 1,
+            "dtype": model.BINARY_DTYPE,
+            "shapes": [[matrix.shape for matrix in model_matrices] for model_matrices in matrices],
+        }
+    ).encode("utf-8")
+    padding = -(len(model.BINARY_MAGIC) + 4 + len(header)) % model.BINARY_ALIGNMENT
+    weights = b"".join(
+        matrix.astype(model.BINARY_DTYPE).tobytes()
+        for model_matrices in matrices
+        for matrix in model_matrices
+    )
+    filepath = tmp_path / "models.bin"
+    filepath.write_bytes(
+        model.BINARY_MAGIC + struct.pack("<I", len(header)) + header + b" " * padding + weights
+    )
+    assert model.load_models(str(filepath)) == models
+    assert model.load_models(str(filepath), amount=2) == models[:2]
+
+
+def test_load_best_models_json(tmp_path):
+    models = [model.Model(inputs=inputs, outputs=1) for inputs in range(1, 6)]
+    for model_ in models:
+        model_.build()
+    filepath = str(tmp_path / "models.json")
+    model.save_models(models, filepath)
+    assert model.load_models(filepath, amount=2) == models[:2]
+
+    # the rest of the file is not read
+    with open(filepath, "w", encoding="utf-8") as file:
+        file.write("[" + ", ".join(json.dumps(model_.serialize()) for model_ in models[:3]))
+        file.write(", [[0.1, 0.2")
+    assert model.load_models(filepath, amount=2) == models[:2]
+    with pytest.raises(ValueError):
+        model.load_models(filepath)
+
+
+@pytest.mark.parametrize(
+    "contents", ["[]", " [ ] ", "[[1, 2], [3]]", "[ {\"a\": [1]} ,\n 2.5, [[]] ]", "[1,2,3]"]
+)
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 1000])
+def test_iterate_json_list(contents, chunk_size):
+    entries = list(model._iterate_json_list(io.StringIO(contents), chunk_size=chunk_size))
+    assert entries == json.loads(contents)
+
+
+@pytest.mark.parametrize("contents", ["", "{}", "[1 2]", "[1,", "[[1, 2]"])
+def test_iterate_json_list_fail(contents):
+    with pytest.raises(ValueError):
+        list(model._iterate_json_list(io.StringIO(contents), chunk_size=2))
+
+
+def test_load_binary_model_memory_mapped(monkeypatch, tmp_path):
+    monkeypatch.setattr(model.Model, "layer_class", model.MatrixLayer)
+    model_ = model.Model(inputs=3, outputs=1)
+    model_.build()
+    filepath = str(tmp_path / "models.bin")
+    model.save_models_binary(models=[model_], filepath=filepath)
+
+    (deserialized_model,) = model.load_models(filepath=filepath)
+    matrix = deserialized_model.serialize_matrices()[0]
+    assert isinstance(matrix, numpy.memmap)
+    deserialized_model.jumble(model.jumble_by_factor_strategy, weight_divergence=1)
+    (reloaded_model,) = model.load_models(filepath=filepath)
+    assert reloaded_model.serialize() == model_.serialize()  # the file is not changed
+
+
+@pytest.mark.parametrize(
+    "inputs, size",
+    [([], 3), ([4], 3), ([1, 2, 3, 4, 5], 3), ([1, 2], 5), ([3, 1, 2], 0)],
+)
+def test_construct_input_windows(inputs, size):
+    windows = model.construct_input_windows(inputs, size)
+    input_deque = collections.deque(maxlen=size)
+    assert windows.shape == (len(inputs), size)
+    for input_, window in zip(inputs, windows):
+        input_deque.append(input_)
+        expected = [x for x, _ in zip_longest(input_deque, range(size), fillvalue=0)]
+        assert list(window) == expected
+
+
+@pytest.mark.parametrize(
+    "inputs, size, chunk_size",
+    [([], 3, 2), ([4], 3, 2), ([1, 2, 3, 4, 5], 3, 2), ([1, 2, 3, 4, 5], 2, 5), ([3, 1, 2], 0, 1)],
+)
+def test_iterate_input_windows(inputs, size, chunk_size):
+    chunks = list(model.iterate_input_windows(inputs, size, chunk_size))
+    assert all(len(chunk) <= chunk_size for chunk in chunks)
+    windows = model.construct_input_windows(inputs, size)
+    if chunks:
+        assert numpy.array_equal(numpy.concatenate(chunks), windows)
+    else:
+        assert windows.size == 0
+
+
+@pytest.mark.parametrize("layer_class", [model.Layer, model.MatrixLayer])
+@pytest.mark.parametrize("inputs", [[], [1], [0, 5, 2, 3, 1, 1, 6, 2]])
+def test_model_compute_windows(layer_class, inputs, monkeypatch):
+    monkeypatch.setattr(model.Model, "layer_class", layer_class)
+    model_ = model.Model(inputs=3, outputs=1)
+    model_.add_layer(length=4)
+    model_.build()
+
+    input_deque = collections.deque(maxlen=model_.inputs)
+    expected_outputs = []
+    for input_ in inputs:
+        input_deque.append(input_)
+        expected_outputs.append(model_.compute(input_deque))
+
+    windows = model.construct_input_windows(inputs, model_.inputs)
+    outputs = model_.compute_windows(windows)
+    assert outputs.shape[0] == len(inputs)
+    for output, expected_output in zip(outputs, expected_outputs):
+        assert all(
+            math.isclose(x, y, rel_tol=1e-9) for x, y in zip(output, expected_output)
+        )
+
+
+@pytest.mark.parametrize("layers", [0, 1, 3])
+def test_model_effective_weights(layers, monkeypatch):
+    monkeypatch.setattr(model.Model, "layer_class", model.MatrixLayer)
+    model_ = model.Model(inputs=4, outputs=1)
+    for _ in range(layers):
+        model_.add_layer(length=5)
+    model_.build()
+
+    expected_weights = numpy.identity(4)
+    for matrix in model_.weight_matrices:
+        expected_weights = numpy.dot(expected_weights, matrix)
+    assert numpy.allclose(model_.effective_weights, expected_weights)
+    assert model_.effective_weights is model_.effective_weights  # cached
+
+    inputs = [3, 1, 2]
+    model_.jumble(model.jumble_by_factor_strategy, weight_divergence=0.5)
+    input_layer = model_._layers[0]
+    input_layer.set_values(inputs)
+    input_layer.propagate()
+    expected_outputs = model_._layers[-1].values
+    assert numpy.allclose(model_.compute(inputs), expected_outputs)
+
+
+def test_model_effective_weights_deserialize(monkeypatch):
+    monkeypatch.setattr(model.Model, "layer_class", model.MatrixLayer)
+    model_ = model.Model(inputs=2, outputs=1)
+    model_.build()
+    assert model_.effective_weights is not None
+
+    model_.deserialize([[[1.0, 2.0], [3.0, 4.0]], [[0.5], [1.0]], [[2.0]]])
+    assert numpy.allclose(model_.effective_weights, [[5.0], [11.0]])
+
+
+@pytest.mark.parametrize(
+    "inputs, outputs, layers, layer_size", [(0, 1, 1, 2), (3, 1, 0, 0), (5, 2, 2, 4)]
+)
+@pytest.mark.parametrize("input_data", [[], [2], [4, 0, 1, 3, 2, 5]])
+def test_object_model_effective_weights(inputs, outputs, layers, layer_size, input_data):
+    model_ = model.Model(inputs=inputs, outputs=outputs)
+    for _ in range(layers):
+        model_.add_layer(length=layer_size)
+    model_.build()
+    model_.jumble(model.jumble_by_factor_strategy, weight_divergence=0.5)
+    assert model_.effective_weights.shape == (inputs, outputs)
+
+    input_layer = model_._layers[0]
+    input_layer.set_values(input_data)
+    input_layer.propagate()
+    expected_outputs = model_._layers[-1].values
+    outputs_ = model_.compute(input_data)
+    assert len(outputs_) == len(expected_outputs)
+    assert all(
+        math.isclose(x, y, rel_tol=1e-9, abs_tol=1e-12)
+        for x, y in zip(outputs_, expected_outputs)
+    )
+
+
+def test_layer_as_matrix():
+    layer = model.Layer(length=2)
+    connected_layer = model.Layer(length=2)
+    layer.connect(connected_layer)
+    layer.nodes[0].weights = [1.0, 2.0]
+    layer.nodes[1].weights = [3.0]  # second connected node only receives one value
+    assert numpy.allclose(layer.as_matrix(), [[0.5, 2.0], [1.5, 0.0]])
+    assert numpy.allclose(connected_layer.as_matrix(), numpy.identity(2))
+
+
+def test_uncompilable_object_model():
+    model_ = model.Model(inputs=2, outputs=1)
+    model_.build()
+    model_._layers[0].nodes[0].connect(model.Node())
+    model_._layers[0].nodes[0].weights.append(1.0)
+    assert model_.weight_matrices is None
+    assert model_.effective_weights is None
+    assert len(model_.compute([1, 2])) == 1
+
+
+@pytest.mark.parametrize("layer_class", [model.Layer, model.MatrixLayer])
+@pytest.mark.parametrize(
+    "jumble_strategy",
+    [model.jumble_by_factor_strategy, model.jumble_by_selection_strategy],
+)
+def test_jumble_with_seed(layer_class, jumble_strategy, monkeypatch):
+    monkeypatch.setattr(model.Model, "layer_class", layer_class)
+    model_ = model.Model(inputs=4, outputs=1)
+    model_.add_layer(length=3)
+    model_.build()
+    serialized_model = model_.serialize()
+
+    random_state = random.getstate()
+    first_copy = model.jumble_with_seed(model_, jumble_strategy, 0.5, seed=3)
+    second_copy = model.jumble_with_seed(model_, jumble_strategy, 0.5, seed=3)
+    assert random.getstate() == random_state
+
+    assert model_.serialize() == serialized_model
+    assert first_copy.serialize() != serialized_model
+    assert first_copy.serialize() == second_copy.serialize()
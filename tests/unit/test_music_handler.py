@@ -5,7 +5,7 @@ from typing import Type
 
 import music21
 import pytest
-from bach_generator.src import music_handler
+from bach_generator.src import cache, music_handler
 
 SIXTEENTH = "16th"
 EIGHT = "8th"
@@ -31,6 +31,44 @@ def test_parse_file(midi_file, handler_type: Type[music_handler.BaseMusicHandler
     assert notes == midi_file.notes
 
 
+@pytest.mark.usefixtures("midi_file")
+@pytest.mark.parametrize(
+    "handler_type", [music_handler.SimpleMusicHandler, music_handler.CopyMusicHandler]
+)
+def test_parse_file_cached(midi_file, handler_type, tmp_path, monkeypatch):
+    parse_cache = cache.ParseCache(directory=str(tmp_path))
+    assert handler_type(cache=parse_cache).parse(midi_file.path) == midi_file.notes
+
+    def parse(_):
+        raise AssertionError("parsed instead of using the cache")
+
+    with monkeypatch.context() as context:
+        context.setattr(music21.converter, "parse", parse)
+        notes = handler_type(cache=parse_cache).parse(midi_file.path)
+    assert notes == midi_file.notes
+
+
+@pytest.mark.usefixtures("midi_file")
+def test_fast_parse_file(midi_file, monkeypatch):
+    def parse(_):
+        raise AssertionError("parsed with music21 instead of reading the midi file")
+
+    monkeypatch.setattr(music21.converter, "parse", parse)
+    handler = music_handler.SimpleMusicHandler(fast_parse=True)
+    assert handler.parse(midi_file.path) == midi_file.notes
+
+
+@pytest.mark.usefixtures("midi_file")
+def test_generate_score_after_cached_parse(midi_file, tmp_path):
+    parse_cache = cache.ParseCache(directory=str(tmp_path))
+    music_handler.CopyMusicHandler(cache=parse_cache).parse(midi_file.path)
+    handler = music_handler.CopyMusicHandler(cache=parse_cache)
+    notes = handler.parse(midi_file.path)
+    score = handler.generate_score(list(reversed(notes)))
+    score_notes = music_handler.extract_notes_from_part(score.parts[0])
+    assert [note.nameWithOctave for note in score_notes] == list(reversed(notes))
+
+
 def test_instantiate_fail():
     with pytest.raises(TypeError):
         music_handler.BaseMusicHandler()
@@ -80,3 +118,28 @@ def test_copy_handler_without_part(note_names):
     handler = music_handler.CopyMusicHandler()
     with pytest.raises(TypeError):
         handler.generate_score(note_names)
+
+
+@pytest.mark.usefixtures("midi_file")
+@pytest.mark.parametrize(
+    "handler_type", [music_handler.SimpleMusicHandler, music_handler.CopyMusicHandler]
+)
+def test_generate_notes(handler_type, midi_file):
+    handler = handler_type()
+    note_names = list(reversed(handler.parse(midi_file.path)))
+    score_notes = music_handler.extract_notes_from_part(
+        handler.generate_score(note_names).flatten()
+    )
+    expected = [(note.pitch.midi, note.offset, note.quarterLength) for note in score_notes]
+    assert handler.generate_notes(note_names) == expected
+
+
+@pytest.mark.usefixtures("midi_file")
+def test_rhythm_after_cached_parse(midi_file, tmp_path):
+    parse_cache = cache.ParseCache(directory=str(tmp_path))
+    handler = music_handler.CopyMusicHandler(cache=parse_cache)
+    handler.parse(midi_file.path)
+    rhythm = handler.rhythm
+    handler = music_handler.CopyMusicHandler(cache=parse_cache, fast_parse=True)
+    handler.parse(midi_file.path)
+    assert handler.rhythm == rhythm
@@ -3,6 +3,7 @@
 
 import os
 import shutil
+import threading
 from datetime import datetime
 
 import music21
@@ -116,3 +117,53 @@ def test_score_write(monkeypatch, mock_datetime):
     assert not os.path.isfile(os.path.join(mock_datetime.EXPECTED_DIRECTORY, filename))
     output_handler_.write(score, filename)
     assert os.path.isfile(os.path.join(mock_datetime.EXPECTED_DIRECTORY, filename))
+
+
+@pytest.mark.usefixtures("mock_datetime")
+def test_notes_write(monkeypatch, mock_datetime):
+    monkeypatch.setattr(output_handler, "datetime", mock_datetime)
+    output_handler_ = output_handler.OutputHandler()
+    output_handler_.setup_output_directory(directory=mock_datetime.DIRECTORY)
+
+    filename = "test.mid"
+    output_handler_.write_notes([(60, 0.0, 1.0), (64, 1.0, 0.5)], filename)
+    score = music21.converter.parse(os.path.join(mock_datetime.EXPECTED_DIRECTORY, filename))
+    notes = [(note.nameWithOctave, note.offset) for note in score.flatten().notes]
+    assert notes == [("C4", 0.0), ("E4", 1.0)]
+
+
+def test_background_writer():
+    writer = output_handler.BackgroundWriter(max_pending=2)
+    written = []
+    for i in range(10):
+        writer.submit(written.append, i)
+    writer.flush()
+    assert written == list(range(10))
+    writer.close()
+    assert writer._thread is None
+
+
+def test_background_writer_bounded():
+    writer = output_handler.BackgroundWriter(max_pending=1)
+    release = threading.Event()
+    writer.submit(release.wait)
+    writer.submit(lambda: None)  # fills the queue while the first job is running
+    submitted = threading.Event()
+    thread = threading.Thread(target=lambda: (writer.submit(lambda: None), submitted.set()))
+    thread.start()
+    assert not submitted.wait(timeout=0.1)
+    release.set()
+    thread.join()
+    writer.close()
+
+
+def test_background_writer_error():
+    def fail():
+        raise OSError("disk full")
+
+    writer = output_handler.BackgroundWriter()
+    writer.submit(fail)
+    with pytest.raises(OSError):
+        writer.flush()
+    writer.flush()  # the error is only raised once
+    writer.close()
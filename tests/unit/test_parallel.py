@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""Tests for the parallel module"""
+
+import copy
+import pickle
+
+import numpy
+import pytest
+from bach_generator import runner
+from bach_generator.src import manager, model, parallel
+
+# pylint: disable=protected-access
+
+
+@pytest.fixture
+def test_runner(midi_file):
+    runner_ = runner.GeneticAlgorithmRunner()
+    runner_._parse_input_file(midi_file.path)
+    return runner_
+
+
+def test_worker_pool_without_models(test_runner):
+    with parallel.WorkerPool() as pool:
+        assert pool(test_runner, []) == []
+        assert pool._pool is None
+
+
+def test_worker_pool(test_runner):
+    managers = [manager.ModelManager(3, 1, 1, 3) for _ in range(5)]
+    expected_ratings = [
+        manager_.rating for manager_ in runner.run_models(test_runner, managers)
+    ]
+
+    with parallel.WorkerPool(processes=2, chunksize=2) as pool:
+        first_managers = pool(test_runner, managers)
+        workers = pool._pool
+        second_managers = pool(test_runner, managers)
+        assert pool._pool is workers
+
+    assert pool._pool is None
+    for managers_ in [first_managers, second_managers]:
+        ratings = [manager_.rating for manager_ in managers_]
+        assert ratings == pytest.approx(expected_ratings)
+        assert all(manager_.encoded_outputs == [] for manager_ in managers_)
+
+
+def test_worker_pool_restarts_for_other_runner(test_runner, midi_file):
+    managers = [manager.ModelManager(3, 1, 1, 3) for _ in range(2)]
+    other_runner = runner.GeneticAlgorithmRunner()
+    other_runner._parse_input_file(midi_file.path)
+
+    with parallel.WorkerPool(processes=1) as pool:
+        pool(test_runner, managers)
+        workers = pool._pool
+        pool(other_runner, managers)
+        assert pool._pool is not workers
+        workers = pool._pool
+        other_runner._parse_input_file(midi_file.path)  # new encoded inputs
+        pool(other_runner, managers)
+        assert pool._pool is not workers
+
+
+def test_worker_pool_close_terminate(test_runner):
+    managers = [manager.ModelManager(3, 1, 1, 3) for _ in range(2)]
+    pool = parallel.WorkerPool(processes=1)
+    pool(test_runner, managers)
+    assert pool._shared_memory
+
+    pool.close(terminate=True)
+    assert pool._pool is None
+    assert pool._run_key is None
+    assert pool._shared_memory == []
+
+
+def test_worker_pool_return_outputs(test_runner):
+    managers = [manager.ModelManager(3, 1, 1, 3) for _ in range(3)]
+    uncompilable_manager = manager.ModelManager(3, 1, 1, 3)
+    uncompilable_manager.model._layers[0].nodes[0].connect(model.Node())
+    managers.append(uncompilable_manager)
+
+    expected_managers = copy.deepcopy(managers)
+    runner.run_models(test_runner, expected_managers)
+
+    with parallel.WorkerPool(processes=2, return_outputs=True) as pool:
+        managers = pool(test_runner, managers)
+
+    for manager_, expected_manager in zip(managers, expected_managers):
+        assert manager_.rated
+        assert manager_.rating == pytest.approx(expected_manager.rating)
+        assert manager_.encoded_outputs == expected_manager.encoded_outputs
+
+
+@pytest.mark.parametrize(
+    "array",
+    [numpy.zeros(shape=(0, 3)), numpy.arange(5), numpy.random.rand(4, 3)],
+)
+def test_shared_array(array):
+    shared_array, memory = parallel.SharedArray.create(array)
+    try:
+        attached_array, attached_memory = shared_array.attach()
+        assert numpy.array_equal(attached_array, array)
+        assert attached_array.dtype == array.dtype
+        del attached_array
+        attached_memory.close()
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+@pytest.mark.parametrize("return_outputs", [False, True])
+def test_worker_pool_seeded_clones(test_runner, return_outputs):
+    parents = [manager.ModelManager(3, 1, 1, 3) for _ in range(2)]
+    clones = [
+        parent.clone_with_seed(model.jumble_by_factor_strategy, 0.5, seed)
+        for seed in range(3)
+        for parent in parents
+    ]
+    expected_managers = copy.deepcopy(clones)
+    runner.run_models(test_runner, expected_managers)
+
+    with parallel.WorkerPool(processes=2, return_outputs=return_outputs) as pool:
+        clones = pool(test_runner, clones)
+
+    for clone, expected_manager in zip(clones, expected_managers):
+        assert clone.origin is not None  # not constructed in the parent process
+        assert clone.rating == pytest.approx(expected_manager.rating)
+        if return_outputs:
+            assert clone.encoded_outputs == expected_manager.encoded_outputs
+
+
+@pytest.mark.parametrize("layer_class", [model.Layer, model.MatrixLayer])
+def test_rate_clone_like_compiled_model(test_runner, layer_class, monkeypatch):
+    monkeypatch.setattr(model.Model, "layer_class", layer_class)
+    monkeypatch.setattr(parallel, "_worker_state", {})
+    monkeypatch.setattr(parallel, "_run_model", None)  # compiled clones are not run
+    parent = manager.ModelManager(3, 1, 2, 3)
+    origin = parent.clone_with_seed(model.jumble_by_factor_strategy, 0.5, seed=4).origin
+    clone_model = origin.construct_model()
+
+    encoded_inputs = numpy.array(test_runner.encoded_inputs, dtype=numpy.int64)
+    shared_inputs, inputs_memory = parallel.SharedArray.create(encoded_inputs)
+    shared_models, models_memory = parallel.SharedArray.create(
+        numpy.frombuffer(pickle.dumps([origin.model]), dtype=numpy.uint8)
+    )
+    try:
+        parallel._init_worker(shared_inputs, {}, test_runner.quantizer, test_runner.judge)
+        result = parallel._rate_clone(
+            (shared_models, 0, origin.seed, origin.jumble_strategy, 0.5, True)
+        )
+        expected_result = parallel._rate_weights((clone_model.effective_weights, True))
+        for memory in parallel._worker_state["shared_memory"]:
+            memory.close()
+    finally:
+        for memory in [inputs_memory, models_memory]:
+            memory.close()
+            memory.unlink()
+
+    assert result[0] == pytest.approx(expected_result[0])
+    assert result[1] == expected_result[1]
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""Tests for the population module"""
+
+import numpy
+import pytest
+from bach_generator.src import manager, model, population
+
+
+@pytest.fixture
+def matrix_layers(monkeypatch):
+    monkeypatch.setattr(model.Model, "layer_class", model.MatrixLayer)
+
+
+def _construct_managers(amount, inputs=3, layers=2, layer_size=4):
+    return [
+        manager.ModelManager(inputs, outputs=1, layers=layers, layer_size=layer_size)
+        for _ in range(amount)
+    ]
+
+
+@pytest.mark.usefixtures("matrix_layers")
+def test_get_shape():
+    manager_ = manager.ModelManager(inputs=3, outputs=1, layers=1, layer_size=4)
+    assert population.get_shape(manager_.model) == (3, 1)
+
+
+def test_get_shape_of_object_model():
+    manager_ = manager.ModelManager(inputs=3, outputs=2, layers=1, layer_size=4)
+    assert population.get_shape(manager_.model) == (3, 2)
+
+
+@pytest.mark.usefixtures("matrix_layers")
+def test_group_by_shape():
+    managers = _construct_managers(3) + _construct_managers(2, inputs=5)
+    managers += _construct_managers(1, layer_size=7)  # same effective shape
+    groups = population.group_by_shape(managers)
+    assert [len(group) for group in groups.values()] == [4, 2]
+
+
+@pytest.mark.usefixtures("matrix_layers")
+@pytest.mark.parametrize("amount, block_elements", [(0, 2**22), (1, 2**22), (7, 10)])
+def test_compute_population(amount, block_elements, monkeypatch):
+    monkeypatch.setattr(population, "MAX_BATCH_ELEMENTS", block_elements)
+    inputs = [0, 4, 2, 1, 3, 3, 0, 2]
+    windows = model.construct_input_windows(inputs, size=3)
+    models = [manager_.model for manager_ in _construct_managers(amount)]
+
+    outputs = population.compute_population(models, windows)
+
+    assert len(outputs) == amount
+    for model_, model_outputs in zip(models, outputs):
+        expected_outputs = model_.compute_windows(windows).ravel()
+        assert numpy.allclose(model_outputs, expected_outputs)
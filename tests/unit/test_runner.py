@@ -1,13 +1,16 @@
 # -*- coding: utf-8 -*-
 """Tests for the runner module"""
 
+import copy
+import glob
 import os
 import shutil
 from dataclasses import dataclass
 
+import numpy
 import pytest
 from bach_generator import runner
-from bach_generator.src import manager, output_handler
+from bach_generator.src import manager, model, output_handler, parallel
 
 # pylint: disable=protected-access
 
@@ -26,11 +29,16 @@ def teardown():
 @dataclass
 class MockModel:
     inputs: int = 1
+    effective_weights = None
 
     @staticmethod
     def compute(inputs):
         return [sum(inputs)]
 
+    @staticmethod
+    def compute_windows(windows):
+        return numpy.sum(windows, axis=1, keepdims=True)
+
     @staticmethod
     def jumble(*_, **__):
         pass
@@ -137,3 +145,264 @@ def test_runner_without_models():
         model_managers=[], data=runner.RunnerData()
     )
     assert managers == []
+
+
+@pytest.mark.usefixtures("midi_file")
+def test_run_models_batched(midi_file, monkeypatch):
+    monkeypatch.setattr(model.Model, "layer_class", model.MatrixLayer)
+    runner_ = runner.GeneticAlgorithmRunner()
+    runner_._parse_input_file(midi_file.path)
+    managers = [manager.ModelManager(5, 1, 1, 4) for _ in range(3)]
+    managers.append(manager.ModelManager.construct_with_model(MockModel(inputs=2)))
+
+    expected_ratings = [
+        manager_.rating for manager_ in runner.run_models(runner_, managers)
+    ]
+    ratings = [
+        manager_.rating for manager_ in runner.run_models_batched(runner_, managers)
+    ]
+    assert ratings == pytest.approx(expected_ratings)
+
+
+@pytest.mark.usefixtures("midi_file")
+def test_run_models_in_chunks(midi_file):
+    runner_ = runner.GeneticAlgorithmRunner()
+    runner_._parse_input_file(midi_file.path)
+    managers = [manager.ModelManager(5, 1, 1, 4) for _ in range(3)]
+
+    expected_ratings = [
+        manager_.rating for manager_ in runner.run_models(runner_, managers)
+    ]
+    managers = runner.run_models_in_chunks(runner_, managers, chunk_size=7)
+    assert [manager_.rating for manager_ in managers] == pytest.approx(expected_ratings)
+    assert all(manager_.rated and not manager_.encoded_outputs for manager_ in managers)
+
+
+def test_runner_write_chunked_model_output(midi_file, monkeypatch):
+    runner_ = runner.GeneticAlgorithmRunner(chunk_size=7)
+    runner_._parse_input_file(midi_file.path)
+    manager_ = manager.ModelManager(5, 1, 1, 4)
+    expected_manager = copy.deepcopy(manager_)
+    runner.run_models(runner_, [expected_manager])
+    runner_.input_windows = {}
+
+    runner.run_models_in_chunks(runner_, [manager_], chunk_size=7)
+    monkeypatch.setattr(runner_.output_writer, "submit", lambda *_: None)
+    runner_._write_model_output(manager_, generation=1)
+    assert manager_.encoded_outputs == expected_manager.encoded_outputs
+    assert runner_.input_windows == {}
+    runner_.close()
+
+
+@pytest.mark.usefixtures("midi_file")
+def test_runner_skips_rated_models(midi_file):
+    run_managers = []
+
+    def run_function(runner_, model_managers):
+        run_managers.append(len(model_managers))
+        return runner.run_models(runner_, model_managers)
+
+    runner_data = runner.RunnerData(
+        generations=3,
+        write_best_model_generation_interval=10,
+        selected_models_per_generation=2,
+        clones_per_model_per_generation=3,
+    )
+    runner_ = runner.GeneticAlgorithmRunner(run_function=run_function)
+    runner_._parse_input_file(midi_file.path)
+    model_managers = runner_.run(
+        model_managers=[manager.ModelManager(3, 1, 1, 3) for _ in range(4)],
+        data=runner_data,
+    )
+
+    assert run_managers == [4, 6, 6]  # only clones are run after first generation
+    assert all(manager_.rated for manager_ in model_managers[:2])
+    assert not any(manager_.rated for manager_ in model_managers[2:])
+
+
+@pytest.mark.usefixtures("midi_file", "mock_datetime")
+def test_runner_run_direct_midi_output(midi_file, monkeypatch, mock_datetime):
+    monkeypatch.setattr(output_handler, "datetime", mock_datetime)
+
+    runner_data = runner.RunnerData(generations=1, write_best_model_generation_interval=1)
+    runner_ = runner.GeneticAlgorithmRunner(direct_midi_output=True)
+    runner_.setup(input_file=midi_file.path, output_directory=TEST_OUTPUT_DIRECTORY)
+    runner_.run(
+        model_managers=[manager.ModelManager.construct_with_model(MockModel(inputs=1))],
+        data=runner_data,
+    )
+
+    filepath = os.path.join(
+        TEST_OUTPUT_DIRECTORY, mock_datetime.DATE_DIRECTORY, "output_1_100.mid"
+    )
+    assert runner_.music_handler.parse(filepath) == midi_file.notes
+
+
+@pytest.mark.usefixtures("midi_file", "mock_datetime")
+def test_runner_run_interrupted(midi_file, monkeypatch, mock_datetime):
+    monkeypatch.setattr(output_handler, "datetime", mock_datetime)
+
+    def run_function(runner_, managers):
+        if runner_.output_writer._thread is not None:  # outputs of generation 1 submitted
+            raise KeyboardInterrupt
+        return runner.run_models(runner_, managers)
+
+    runner_data = runner.RunnerData(generations=2, write_best_model_generation_interval=1)
+    runner_ = runner.GeneticAlgorithmRunner(run_function=run_function)
+    runner_.setup(input_file=midi_file.path, output_directory=TEST_OUTPUT_DIRECTORY)
+    with pytest.raises(KeyboardInterrupt):
+        runner_.run(
+            model_managers=[manager.ModelManager(3, 1, 1, 3) for _ in range(2)],
+            data=runner_data,
+        )
+    output_directory = os.path.join(TEST_OUTPUT_DIRECTORY, mock_datetime.DATE_DIRECTORY)
+    assert glob.glob(os.path.join(output_directory, "output_1_*.mid"))
+    runner_.close()
+
+
+@pytest.mark.usefixtures("midi_file")
+def test_runner_run_interrupted_write_error(midi_file, monkeypatch):
+    def run_function(runner_, managers):
+        if runner_.output_writer._thread is not None:  # outputs of generation 1 submitted
+            raise KeyboardInterrupt
+        return runner.run_models(runner_, managers)
+
+    def write_notes(*_):
+        raise OSError("disk full")
+
+    runner_data = runner.RunnerData(generations=2, write_best_model_generation_interval=1)
+    runner_ = runner.GeneticAlgorithmRunner(run_function=run_function)
+    runner_._parse_input_file(midi_file.path)
+    monkeypatch.setattr(runner_, "_write_notes", write_notes)
+    try:
+        with pytest.raises(KeyboardInterrupt):
+            runner_.run(
+                model_managers=[manager.ModelManager(3, 1, 1, 3) for _ in range(2)],
+                data=runner_data,
+            )
+    finally:
+        runner_.close()
+
+
+@pytest.mark.usefixtures("midi_file", "mock_datetime")
+def test_runner_run_progress_callback(midi_file, monkeypatch, mock_datetime):
+    monkeypatch.setattr(output_handler, "datetime", mock_datetime)
+
+    runner_data = runner.RunnerData(generations=5, write_best_model_generation_interval=10)
+    runner_ = runner.GeneticAlgorithmRunner()
+    runner_.setup(input_file=midi_file.path, output_directory=TEST_OUTPUT_DIRECTORY)
+    results = []
+
+    def progress_callback(result):
+        results.append(result)
+        if result.generation == 3:
+            runner_.stop()
+
+    model_managers = runner_.run(
+        model_managers=[manager.ModelManager(3, 1, 1, 3) for _ in range(2)],
+        data=runner_data,
+        progress_callback=progress_callback,
+    )
+    assert [result.generation for result in results] == [1, 2, 3]
+    assert results[-1].rating == model_managers[0].rating
+    assert results[-1].models == len(model_managers)
+
+    # a stopped run can be continued
+    runner_.run(
+        model_managers, data=runner_data, start_generation=4, progress_callback=results.append
+    )
+    assert [result.generation for result in results] == [1, 2, 3, 4, 5]
+    runner_.close()
+
+
+@pytest.mark.usefixtures("midi_file", "mock_datetime")
+def test_runner_iterate(midi_file, monkeypatch, mock_datetime):
+    monkeypatch.setattr(output_handler, "datetime", mock_datetime)
+
+    runner_data = runner.RunnerData(
+        generations=10,
+        write_best_model_generation_interval=1,
+        selected_models_per_generation=2,
+        clones_per_model_per_generation=2,
+    )
+    runner_ = runner.GeneticAlgorithmRunner()
+    runner_.setup(input_file=midi_file.path, output_directory=TEST_OUTPUT_DIRECTORY)
+    results = runner_.iterate([manager.ModelManager(3, 1, 1, 3) for _ in range(3)], runner_data)
+
+    first = next(results)
+    assert first.generation == 1
+    assert len(first.ratings) == 3
+    assert numpy.isclose(first.rating, first.model_managers[0].rating, equal_nan=True)
+    assert first.models == len(first.model_managers) == 6
+    second = next(results)
+    assert second.generation == 2
+    assert len(second.ratings) == 6  # selected models and their clones
+    results.close()  # stops the run early and flushes the outputs
+
+    output_directory = os.path.join(TEST_OUTPUT_DIRECTORY, mock_datetime.DATE_DIRECTORY)
+    assert glob.glob(os.path.join(output_directory, "output_2_*.mid"))
+    assert not glob.glob(os.path.join(output_directory, "output_3_*.mid"))
+    runner_.close()
+
+
+@pytest.mark.usefixtures("midi_file")
+def test_runner_run_without_progress_callback(midi_file, monkeypatch):
+    def generation_result(*_):
+        raise AssertionError("results are only built for a progress callback")
+
+    monkeypatch.setattr(runner, "_generation_result", generation_result)
+    runner_ = runner.GeneticAlgorithmRunner()
+    runner_._parse_input_file(midi_file.path)
+    model_managers = runner_.run(
+        [manager.ModelManager(3, 1, 1, 3) for _ in range(2)],
+        runner.RunnerData(generations=2, write_best_model_generation_interval=10),
+    )
+    assert len(model_managers) == 72  # 2 generations of 5 clones per model
+    runner_.close()
+
+
+def test_runner_iterate_without_models():
+    assert not list(runner.GeneticAlgorithmRunner().iterate([], runner.RunnerData()))
+
+
+def test_runner_stop_before_run():
+    runner_ = runner.GeneticAlgorithmRunner(run_function=None)
+    runner_.stop()
+    model_managers = [manager.ModelManager(3, 1, 1, 3)]
+    assert runner_.run(model_managers, data=runner.RunnerData()) == model_managers
+
+
+@pytest.mark.usefixtures("midi_file", "mock_datetime")
+def test_runner_run_in_parallel(midi_file, monkeypatch, mock_datetime):
+    monkeypatch.setattr(output_handler, "datetime", mock_datetime)
+
+    runner_data = runner.RunnerData(
+        generations=2,
+        write_best_model_generation_interval=1,
+        selected_models_per_generation=2,
+        clones_per_model_per_generation=1,
+    )
+    runner_ = runner.GeneticAlgorithmRunner(run_function=parallel.WorkerPool())
+    runner_.setup(input_file=midi_file.path, output_directory=TEST_OUTPUT_DIRECTORY)
+    try:
+        model_managers = runner_.run(
+            model_managers=[manager.ModelManager(3, 1, 1, 3) for _ in range(3)],
+            data=runner_data,
+        )
+    finally:
+        runner_.close()
+
+    assert len(model_managers) == 4
+    output_directory = os.path.join(TEST_OUTPUT_DIRECTORY, mock_datetime.DATE_DIRECTORY)
+    for generation in [1, 2]:
+        filename = f"output_{generation}_*.mid"
+        assert glob.glob(os.path.join(output_directory, filename))
+
+
+def test_append_seeded_clones():
+    managers = [manager.ModelManager(3, 1, 1, 3) for _ in range(2)]
+    data = runner.RunnerData(clones_per_model_per_generation=2, seeded_clones=True)
+    runner._append_clones(managers, data)
+    assert len(managers) == 6
+    assert all(manager_.origin is None for manager_ in managers[:2])
+    assert all(manager_.origin is not None for manager_ in managers[2:])
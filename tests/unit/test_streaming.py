@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Tests for the streaming module"""
+
+import math
+import random
+
+import numpy
+import pytest
+from bach_generator.src import encoder, judge, manager, model, streaming
+
+
+class MockModel:
+    inputs = 2
+    outputs = 1
+
+    @staticmethod
+    def compute_windows(windows):
+        return numpy.zeros(shape=(len(windows), 1))
+
+
+def _setup(inputs):
+    quantizer_ = encoder.Quantizer()
+    quantizer_.setup(inputs)
+    judge_ = judge.Judge()
+    judge_.setup(inputs)
+    return quantizer_, judge_
+
+
+@pytest.mark.parametrize("layer_class", [model.Layer, model.MatrixLayer])
+@pytest.mark.parametrize("chunk_size", [1, 3, 50, streaming.DEFAULT_CHUNK_SIZE])
+def test_rate_in_chunks(layer_class, chunk_size, monkeypatch):
+    monkeypatch.setattr(model.Model, "layer_class", layer_class)
+    inputs = random.choices(list(range(12)), k=100)
+    quantizer_, judge_ = _setup(inputs)
+    manager_ = manager.ModelManager(inputs=4, outputs=1, layers=1, layer_size=5)
+    manager_.run_model(inputs, quantizer_)
+    manager_.get_rated_by(judge_, inputs)
+
+    rating = streaming.rate_in_chunks(
+        manager_.model, inputs, quantizer_, judge_, chunk_size
+    )
+    assert math.isclose(rating, manager_.rating, rel_tol=1e-9, abs_tol=1e-12)
+
+
+def test_rate_in_chunks_constant_outputs():
+    inputs = [0, 4, 2, 1, 4]
+    quantizer_, judge_ = _setup(inputs)
+    assert math.isnan(
+        streaming.rate_in_chunks(MockModel(), inputs, quantizer_, judge_, chunk_size=2)
+    )
+
+
+@pytest.mark.parametrize("inputs, outputs", [([], 1), ([3], 1), ([1, 2, 3], 2)])
+def test_rate_in_chunks_fail_insufficient_data(inputs, outputs):
+    quantizer_, judge_ = _setup(inputs)
+    model_ = model.Model(inputs=2, outputs=outputs)
+    model_.build()
+    with pytest.raises(ValueError):
+        streaming.rate_in_chunks(model_, inputs, quantizer_, judge_)
+
+
+@pytest.mark.parametrize("inputs", [[], [3], list(range(20))])
+@pytest.mark.parametrize("chunk_size", [1, 3, 50])
+def test_compute_in_chunks(inputs, chunk_size):
+    model_ = model.Model(inputs=4, outputs=1)
+    model_.build()
+    expected_outputs = model_.compute_windows(model.construct_input_windows(inputs, 4))
+    outputs = streaming.compute_in_chunks(model_, inputs, chunk_size)
+    assert outputs.shape == (len(inputs), 1)
+    assert numpy.allclose(outputs, expected_outputs)